@@ -0,0 +1,4 @@
+""" Benchmarks for pycyqle builds, run against synthetic SQLite schemas.
+
+Every module is runnable on its own, e.g. python -m benchmarks.strategies
+"""
@@ -0,0 +1,85 @@
+""" Compares the generated row assemblers with the generic loop builds
+used before, which looked up every component, column and carrier of
+every row, on rows of increasing width."""
+
+import time
+
+from pycyqle.assembler import compile_assembler
+from pycyqle.factory import Component
+
+ROWS = 20000
+REPEAT = 5
+
+
+def model_class(width):
+    def _setter(name):
+        def _set(self, value):
+            setattr(self, name, value)
+        return _set
+
+    namespace = {
+        'set_c{}'.format(i): _setter('c{}'.format(i)) for i in range(width)
+    }
+    namespace['__init__'] = lambda self, _id: setattr(self, 'id', _id)
+    return type('Model', (), namespace)
+
+
+def generic(constructor, components, data):
+    """ The assembly loop builds ran before assemblers were generated."""
+    _map = {}
+    payloads = {}
+    for row in data:
+        _id = row['__id__']
+        if _id in _map:
+            model = _map[_id]
+        else:
+            model = constructor(_id)
+            _map[_id] = model
+
+        for component in components:
+            value = row[component.name()]
+            carrier = getattr(model, component.carrier())
+            carrier(value)
+
+        p_id = row['__pid__']
+        if p_id not in payloads:
+            payloads[p_id] = []
+        payloads[p_id].append(model)
+
+
+def rate(function, *args):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        function(*args)
+    return ROWS * REPEAT / (time.perf_counter() - start)
+
+
+def main():
+    print('{:>5} {:>12} {:>12} {:>12} {:>8}'.format(
+        'width', 'generic r/s', 'keyed r/s', 'tuple r/s', 'speedup'
+    ))
+    for width in (1, 5, 20):
+        constructor = model_class(width)
+        components = [
+            Component().name('c{}'.format(i)).carrier('set_c{}'.format(i))
+            for i in range(width)
+        ]
+        tuples = [(i, i // 3) + (i,) * width for i in range(ROWS)]
+        names = ['__id__', '__pid__'] + [c.name() for c in components]
+        dicts = [dict(zip(names, row)) for row in tuples]
+
+        keyed = compile_assembler(constructor, components, True, False)
+        positional = compile_assembler(constructor, components, True, True)
+        baseline = rate(generic, constructor, components, dicts)
+        fast = rate(lambda: positional(tuples, {}, {}, {}))
+        print('{:>5} {:>12.0f} {:>12.0f} {:>12.0f} {:>7.2f}x'.format(
+            width,
+            baseline,
+            rate(lambda: keyed(dicts, {}, {}, {})),
+            fast,
+            fast / baseline
+        ))
+
+
+if __name__ == '__main__':
+    main()
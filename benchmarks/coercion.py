@@ -0,0 +1,121 @@
+""" Compares converting values in carriers, row by row, with converting
+whole columns by ctype before assembly (build(..., coerce=True)).
+
+Both factories read the same table, whose numbers, dates and flags are
+stored as text, and produce the same models.
+"""
+
+from datetime import date
+from decimal import Decimal
+import sqlite3
+import timeit
+
+from pycyqle.connectors import SQLiteConnector
+from pycyqle.factory import Component, Factory
+
+ROWS = 20000
+COLUMNS = {
+    'amount': 'decimal',
+    'quantity': 'int',
+    'ratio': 'float',
+    'day': 'date',
+    'active': 'bool'
+}
+
+
+class Parsed:
+    """ Model whose carriers convert the values they are handed."""
+
+    def __init__(self, _id):
+        self.id = _id
+
+    def set_amount(self, value):
+        self.amount = Decimal(value)
+
+    def set_quantity(self, value):
+        self.quantity = int(value)
+
+    def set_ratio(self, value):
+        self.ratio = float(value)
+
+    def set_day(self, value):
+        # date.fromisoformat needs Python 3.7
+        self.day = date(*map(int, value.split('-')))
+
+    def set_active(self, value):
+        self.active = value.lower() in ('1', 'true')
+
+
+class Coerced:
+    """ Model whose carriers store values as they are."""
+
+    def __init__(self, _id):
+        self.id = _id
+
+    def set_amount(self, value):
+        self.amount = value
+
+    def set_quantity(self, value):
+        self.quantity = value
+
+    def set_ratio(self, value):
+        self.ratio = value
+
+    def set_day(self, value):
+        self.day = value
+
+    def set_active(self, value):
+        self.active = value
+
+
+def database():
+    conn = sqlite3.connect(':memory:')
+    conn.execute(
+        'CREATE TABLE item (id INTEGER PRIMARY KEY, {})'.format(
+            ', '.join(c + ' TEXT' for c in COLUMNS)
+        )
+    )
+    conn.executemany(
+        'INSERT INTO item VALUES (?, ?, ?, ?, ?, ?)',
+        (
+            (i, '{}.{:02d}'.format(i, i % 100), str(i % 50),
+             str(i / 7), '2020-01-{:02d}'.format(i % 28 + 1),
+             'true' if i % 2 else 'false')
+            for i in range(ROWS)
+        )
+    )
+    conn.commit()
+    return SQLiteConnector(conn)
+
+
+def factory(model, typed):
+    return Factory().name(model.__name__).table('item').primary_key('id') \
+        .model(model).components([
+            Component().name(c).column(c).carrier('set_' + c)
+            .ctype(ctype if typed else 'string')
+            for c, ctype in COLUMNS.items()
+        ])
+
+
+def main():
+    mgr = database()
+    order = list(COLUMNS)
+    parsed = factory(Parsed, False)
+    coerced = factory(Coerced, True)
+    runs = (
+        ('carriers', lambda: parsed.build(mgr, order, None)),
+        ('coercion', lambda: coerced.build(mgr, order, None, coerce=True))
+    )
+    first, second = (build() for _, build in runs)
+    assert all(vars(a) == vars(b) for a, b in zip(first, second))
+
+    print('{:>10} {:>10}'.format('mode', 'seconds'))
+    for mode, build in runs:
+        print('{:>10} {:>10.3f}'.format(
+            mode, min(timeit.repeat(build, number=1, repeat=5))
+        ))
+    mgr.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+""" Compares two result files written by benchmarks.suite.
+
+Every benchmark found in both files is reported with the relative change
+of its median latency, throughput and peak memory. Changes for the worse
+beyond the threshold are flagged as regressions, and the exit status is
+1 if there is any.
+
+    python -m benchmarks.compare baseline.json current.json [--threshold 0.1]
+"""
+
+import argparse
+import json
+import sys
+
+# metric: True if higher is better
+METRICS = {
+    'p50': False,
+    'throughput': True,
+    'peak_memory': False
+}
+
+
+def load(path):
+    with open(path, 'r') as handle:
+        return json.load(handle)
+
+
+def change(before, after):
+    return (after - before) / before if before else 0.0
+
+
+def compare(baseline, current, threshold=0.1):
+    """ Returns (name, metric, before, after, change, regressed) tuples for
+    every metric of the benchmarks present in both results."""
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        for metric, higher_is_better in METRICS.items():
+            before = baseline[name][metric]
+            after = current[name][metric]
+            delta = change(before, after)
+            worse = -delta if higher_is_better else delta
+            rows.append(
+                (name, metric, before, after, delta, worse > threshold)
+            )
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change counted as a regression')
+    args = parser.parse_args(argv)
+
+    baseline, current = load(args.baseline), load(args.current)
+    print('baseline {} vs current {}'.format(
+        baseline['meta'].get('commit'), current['meta'].get('commit')
+    ))
+    rows = compare(baseline['results'], current['results'], args.threshold)
+    for name, metric, before, after, delta, regressed in rows:
+        print('{:<24} {:<12} {:>14.6g} {:>14.6g} {:>+8.1%}{}'.format(
+            name, metric, before, after, delta,
+            '  REGRESSION' if regressed else ''
+        ))
+
+    missing = set(baseline['results']) ^ set(current['results'])
+    for name in sorted(missing):
+        print('{:<24} only in one of the results'.format(name))
+
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
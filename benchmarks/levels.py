@@ -0,0 +1,73 @@
+""" Measures what builds allocate to place factories in the order tree.
+
+Builds used to deep-copy every inventory factory they walked through,
+including its components, inventory and nested factories, just to attach
+a parent pointer. They now create one small Level object per inventory
+level instead. This compares the two on schemas of increasing depth and
+component width, along with the allocations of a whole build.
+"""
+
+from copy import deepcopy
+import tracemalloc
+
+from benchmarks.schema import chain
+from pycyqle.context import Level
+
+DEPTH = 4
+FANOUT = 2
+ROOTS = 10
+
+
+def allocated(function, repeat=100):
+    """ Returns the bytes still allocated after one call of function,
+    with its result kept alive, on average."""
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    results = []
+    for _ in range(repeat):
+        results.append(function())
+    total = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return total / repeat
+
+
+def copies(factory):
+    """ What a build used to allocate: a deep copy per inventory level."""
+    copied = []
+    while factory.inventory_items():
+        inv = factory.inventory('children')
+        copied.append(deepcopy(inv.factory()))
+        factory = inv.factory()
+    return copied
+
+
+def levels(factory):
+    """ What a build allocates now: a Level per inventory level."""
+    level = Level(factory)
+    created = [level]
+    while factory.inventory_items():
+        inv = factory.inventory('children')
+        level = Level(inv.factory(), level, inv, 'subquery')
+        created.append(level)
+        factory = inv.factory()
+    return created
+
+
+def main():
+    print('{:>5} {:>12} {:>12} {:>12}'.format(
+        'width', 'deepcopy B', 'levels B', 'build B'
+    ))
+    for width in (1, 10, 50):
+        mgr, factory, order = chain(DEPTH, FANOUT, ROOTS, width)
+        ids = list(range(ROOTS))
+        print('{:>5} {:>12.0f} {:>12.0f} {:>12.0f}'.format(
+            width,
+            allocated(lambda: copies(factory)),
+            allocated(lambda: levels(factory)),
+            allocated(lambda: factory.build(mgr, order, ids), repeat=10)
+        ))
+        mgr.close()
+
+
+if __name__ == '__main__':
+    main()
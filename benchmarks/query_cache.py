@@ -0,0 +1,54 @@
+""" Measures builds served by a caching connector.
+
+Builds of overlapping orders over the same IDs repeat most of their
+queries: a narrow order only needs the root query of a wide one, and
+every order shares the child queries of the levels they have in common.
+This builds a rotation of such orders on the chain schema, with and
+without a CachingConnector, and reports the hit ratio and the bytes the
+cache kept from being fetched again.
+"""
+
+import random
+import time
+
+from benchmarks.schema import chain, order
+from pycyqle.connectors import CachingConnector
+
+DEPTH = 3
+FANOUT = 4
+ROOTS = 500
+WIDTH = 4
+IDS = 100
+REPEAT = 20
+
+
+def run(mgr, factory, orders):
+    rng = random.Random(0)
+    samples = [rng.sample(range(ROOTS), IDS) for _ in range(4)]
+    start = time.perf_counter()
+    for i in range(REPEAT):
+        factory.build(mgr, orders[i % len(orders)], samples[i % 4])
+    return (time.perf_counter() - start) / REPEAT
+
+
+def main():
+    mgr, factory, _ = chain(DEPTH, FANOUT, ROOTS, WIDTH)
+    orders = [
+        order(DEPTH, WIDTH, levels=levels) for levels in range(1, DEPTH + 1)
+    ]
+    plain = run(mgr, factory, orders)
+    caching = CachingConnector(mgr)
+    cached = run(caching, factory, orders)
+    stats = caching.stats()
+    print('{:>10} {:>10} {:>8} {:>10} {:>14}'.format(
+        'plain ms', 'cached ms', 'speedup', 'hit ratio', 'bytes saved'
+    ))
+    print('{:>10.2f} {:>10.2f} {:>7.2f}x {:>10.2f} {:>14}'.format(
+        plain * 1000, cached * 1000, plain / cached, stats['hit_ratio'],
+        stats['bytes_saved']
+    ))
+    caching.close()
+
+
+if __name__ == '__main__':
+    main()
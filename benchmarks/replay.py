@@ -0,0 +1,63 @@
+""" Profiles builds against a recording instead of a database.
+
+With a path to a recording (see pycyqle.recording), the synthetic chain
+order is built from it; without one, the build is first recorded on the
+in-memory chain schema. Replayed builds do no I/O, so their time is the
+cost of assembling models alone and stays comparable across machines;
+--latency adds the recorded query times back.
+
+    python -m benchmarks.replay [recording] [--latency]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.schema import chain
+from pycyqle.recording import RecordingConnector, ReplayConnector
+from pycyqle.tracing import ProfileAggregator
+
+DEPTH = 3
+FANOUT = 4
+ROOTS = 500
+WIDTH = 8
+REPEAT = 10
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('recording', nargs='?')
+    parser.add_argument('--latency', action='store_true',
+                        help='wait as long as the recorded queries took')
+    args = parser.parse_args(argv)
+
+    mgr, factory, order = chain(DEPTH, FANOUT, ROOTS, WIDTH)
+    ids = list(range(ROOTS))
+    path = args.recording
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), 'chain.rec')
+        recorder = RecordingConnector(mgr)
+        factory.build(recorder, order, ids)
+        recorder.recording.save(path)
+        print('recorded {} queries to {} ({} bytes)'.format(
+            len(recorder.recording), path, os.path.getsize(path)
+        ))
+    mgr.close()
+
+    replay = ReplayConnector.build(
+        path, 'recorded' if args.latency else None
+    )
+    profile = ProfileAggregator()
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        replay.rewind()
+        factory.build(replay, order, ids, tracer=profile)
+    print('{:.2f} ms per build'.format(
+        (time.perf_counter() - start) / REPEAT * 1000
+    ))
+    print(profile.table())
+
+
+if __name__ == '__main__':
+    main()
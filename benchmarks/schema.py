@@ -0,0 +1,172 @@
+""" Synthetic schemas for benchmarking builds against SQLite.
+
+A schema of a given depth has tables level0 to level{depth}, where every
+row has fanout children in the next level and width integer columns c0,
+c1, ..., and one factory per table, defined as factory JSON would define
+it, whose 'children' inventory item leads to the next level.
+"""
+
+from functools import partial
+import json
+import os
+import sqlite3
+
+from pycyqle.connectors import SQLiteConnector
+from pycyqle.registry import build_registry
+
+
+class Node:
+    """ Model with a setter for any attribute, e.g. set_c0(value)."""
+
+    def __init__(self, _id):
+        self.id = _id
+
+    def __getattr__(self, name):
+        if not name.startswith('set_'):
+            raise AttributeError(name)
+        return partial(setattr, self, name[4:])
+
+
+# deepest schema whose levels have a model class
+MAX_DEPTH = 15
+
+# Level0, Level1, ...: one Node subclass per table, since builds keep
+# models in a map per model class and IDs repeat across tables
+for _level in range(MAX_DEPTH + 1):
+    _name = 'Level{}'.format(_level)
+    globals()[_name] = type(_name, (Node,), {'__module__': __name__})
+
+
+def columns(width):
+    return ['c{}'.format(i) for i in range(width)]
+
+
+def definitions(depth, width=1):
+    """ Returns the factory definitions of the schema by factory name.
+    Inventory items refer to the JSON file of their factory, as written
+    by write."""
+    if depth > MAX_DEPTH:
+        raise ValueError('schemas are at most {} levels deep'.format(
+            MAX_DEPTH
+        ))
+
+    factories = {}
+    for level in range(depth + 1):
+        table = 'level{}'.format(level)
+        factories[table] = {
+            'name': table,
+            'table': table,
+            'primary_key': 'id',
+            'model': '{}.Level{}'.format(__name__, level),
+            'components': {
+                c: {'column': c, 'carrier': 'set_' + c, 'type': 'int'}
+                for c in columns(width)
+            },
+            'inventory': {}
+        }
+        if level < depth:
+            child = 'level{}'.format(level + 1)
+            factories[table]['inventory']['children'] = {
+                'factory': child + '.json',
+                'join': {
+                    'table': table,
+                    'on': '{}.id = {}.parent_id'.format(table, child)
+                },
+                'carrier': 'set_children'
+            }
+    return factories
+
+
+def populate(conn, depth, fanout, roots, width=1):
+    """ Creates and fills the tables of the schema; level0 has roots rows.
+    Returns the number of rows of every level."""
+    names = columns(width)
+    counts = []
+    count = roots
+    for level in range(depth + 1):
+        table = 'level{}'.format(level)
+        conn.execute(
+            'CREATE TABLE {} (id INTEGER PRIMARY KEY, parent_id INTEGER, '
+            '{})'.format(table, ', '.join(c + ' INTEGER' for c in names))
+        )
+        conn.executemany(
+            'INSERT INTO {} VALUES ({})'.format(
+                table, ', '.join('?' * (width + 2))
+            ),
+            (
+                (i, i // fanout if level else None) + (i,) * width
+                for i in range(count)
+            )
+        )
+        if level:
+            conn.execute('CREATE INDEX {0}_parent ON {0} (parent_id)'.format(
+                table
+            ))
+        counts.append(count)
+        count *= fanout
+    conn.commit()
+    return counts
+
+
+def order(depth, width=1, levels=None, components=None):
+    """ Returns an order for level0 reaching levels levels down (all of
+    them by default) and asking for the first components columns of each
+    (all of them by default)."""
+    names = columns(width)[:components]
+    levels = depth if levels is None else levels
+    result = names
+    for _ in range(levels):
+        result = {'__components__': names, 'children': result}
+    return result
+
+
+def factories(depth, width=1):
+    """ Returns the schema's factories by name, kept out of
+    Factory.FACTORIES so that schemas of different shapes can coexist."""
+    return build_registry(
+        {
+            name: _by_name(definition)
+            for name, definition in definitions(depth, width).items()
+        },
+        {},
+        validate=True
+    )
+
+
+def _by_name(definition):
+    definition = json.loads(json.dumps(definition))
+    for item in definition['inventory'].values():
+        item['factory'] = item['factory'][:-len('.json')]
+    return definition
+
+
+def write(directory, depth, fanout, roots, width=1):
+    """ Writes the factory JSON files of the schema and a populated SQLite
+    database, schema.sqlite, to directory. Returns the path of the
+    database and the number of rows of every level."""
+    os.makedirs(directory, exist_ok=True)
+    for name, definition in definitions(depth, width).items():
+        path = os.path.join(directory, name + '.json')
+        with open(path, 'w') as handle:
+            json.dump(definition, handle, indent=2)
+
+    path = os.path.join(directory, 'schema.sqlite')
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    counts = populate(conn, depth, fanout, roots, width)
+    conn.close()
+    return path, counts
+
+
+def chain(depth, fanout, roots, width=1):
+    """ Returns a connector to an in-memory database with the schema,
+    along with the factory for level0 and an order that reaches all the
+    way down."""
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
+    populate(conn, depth, fanout, roots, width)
+    return (
+        SQLiteConnector(conn),
+        factories(depth, width)['level0'],
+        order(depth, width)
+    )
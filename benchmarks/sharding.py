@@ -0,0 +1,63 @@
+""" Measures how sharded builds scale with the number of processes.
+
+A single build assembles its models on one core; sharded builds split
+the IDs over worker processes, each with a connection of its own. Every
+process count up to the number of cores builds all of the root IDs of
+the synthetic schema, returning models and columns, and the speedup over
+a plain build is reported. Process start-up and pickling are included,
+as they are part of the cost of a sharded build.
+"""
+
+import os
+import tempfile
+import time
+
+from benchmarks import schema
+from pycyqle.connectors import ConnectorConfig, SQLiteConnector
+
+DEPTH = 3
+FANOUT = 4
+ROOTS = 5000
+WIDTH = 4
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix='pycyqle-shards-')
+    path, counts = schema.write(directory, DEPTH, FANOUT, ROOTS, WIDTH)
+    config = ConnectorConfig(SQLiteConnector, {'database': path})
+    factory = schema.factories(DEPTH, WIDTH)['level0']
+    order = schema.order(DEPTH, WIDTH)
+    ids = list(range(ROOTS))
+
+    mgr = config()
+    baseline = timed(lambda: factory.build(mgr, order, ids))
+    mgr.close()
+    print('{} models, plain build {:.3f} s'.format(sum(counts), baseline))
+    print('{:>9} {:>10} {:>8} {:>12} {:>8}'.format(
+        'processes', 'models s', 'speedup', 'columnar s', 'speedup'
+    ))
+    cores = os.cpu_count() or 1
+    processes = 1
+    while True:
+        models = timed(lambda: factory.build_sharded(
+            config, order, ids, processes
+        ))
+        columns = timed(lambda: factory.build_sharded(
+            config, order, ids, processes, columnar=True
+        ))
+        print('{:>9} {:>10.3f} {:>7.2f}x {:>12.3f} {:>7.2f}x'.format(
+            processes, models, baseline / models, columns, baseline / columns
+        ))
+        if processes >= cores:
+            break
+        processes = min(processes * 2, cores)
+
+
+if __name__ == '__main__':
+    main()
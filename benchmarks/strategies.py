@@ -0,0 +1,64 @@
+""" Compares the 'subquery' and 'ids' inventory loading strategies on
+orders of increasing depth.
+
+Besides build time, the total length of the SQL sent to the database is
+reported: nested subqueries grow with every level of the order while ID
+propagation only grows with the number of parent IDs. The 'ids' strategy
+runs with chunked binds since SQLite binds named parameters in time
+quadratic to their number.
+"""
+
+import random
+import time
+
+from benchmarks.schema import chain
+
+ROOTS = 500
+FANOUT = 3
+IDS = 100
+REPEAT = 20
+CHUNK_SIZE = 500
+
+
+class SizingConnector:
+    def __init__(self, mgr):
+        self._mgr = mgr
+        self.sent = 0
+
+    def execute(self, query, binds={}):
+        self.sent += len(query)
+        return self._mgr.execute(query, binds)
+
+    def data(self):
+        return self._mgr.data()
+
+
+def measure(mgr, factory, order, strategy):
+    random.seed(0)
+    mgr = SizingConnector(mgr)
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        ids = random.sample(range(ROOTS), IDS)
+        factory.build(
+            mgr, order, ids, chunk_size=CHUNK_SIZE, strategy=strategy
+        )
+    return (time.perf_counter() - start) / REPEAT, mgr.sent // REPEAT
+
+
+def main():
+    print('{:>5} {:>12} {:>12} {:>8} {:>12} {:>12}'.format(
+        'depth', 'subquery ms', 'ids ms', 'speedup', 'subquery sql', 'ids sql'
+    ))
+    for depth in range(1, 6):
+        mgr, factory, order = chain(depth, FANOUT, ROOTS)
+        subquery, subquery_sql = measure(mgr, factory, order, 'subquery')
+        ids, ids_sql = measure(mgr, factory, order, 'ids')
+        print('{:>5} {:>12.2f} {:>12.2f} {:>7.2f}x {:>12} {:>12}'.format(
+            depth, subquery * 1000, ids * 1000, subquery / ids,
+            subquery_sql, ids_sql
+        ))
+        mgr.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+""" Benchmark suite: measures Factory.build on synthetic schemas of several
+shapes and writes the results as JSON, to be compared between commits
+with benchmarks.compare.
+
+For every schema (depth, fan-out, root rows and component width), the
+factory JSON files and the SQLite database are generated in a working
+directory and the factories are loaded from them. Every order shape is
+then built repeatedly for random samples of root IDs, reporting latency
+percentiles, throughput in models per second and the peak memory of a
+build.
+
+    python -m benchmarks.suite results.json [--quick] [--repeat N]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import schema
+from pycyqle.connectors import SQLiteConnector
+from pycyqle.registry import compile_registry, load_registry
+
+# name: (depth, fanout, roots, width)
+SCHEMAS = {
+    'shallow-wide': (1, 20, 2000, 20),
+    'balanced': (3, 4, 1000, 5),
+    'deep-narrow': (6, 2, 500, 2)
+}
+
+QUICK_SCHEMAS = {
+    name: (depth, fanout, roots // 10, width)
+    for name, (depth, fanout, roots, width) in SCHEMAS.items()
+}
+
+
+def shapes(depth, width):
+    """ Returns the orders measured on a schema, by name."""
+    return {
+        'root': schema.order(depth, width, levels=0),
+        'half': schema.order(depth, width, levels=max(depth // 2, 1)),
+        'full': schema.order(depth, width),
+        'narrow': schema.order(depth, width, components=1)
+    }
+
+
+def percentile(values, q):
+    """ Returns the q-th percentile of values, by nearest rank."""
+    ordered = sorted(values)
+    rank = int(round(q / 100 * len(ordered)))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def count(models):
+    """ Returns the number of models in the trees rooted at models."""
+    return sum(
+        1 + count(getattr(model, 'children', ())) for model in models
+    )
+
+
+def peak_memory(build):
+    tracemalloc.start()
+    try:
+        build()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(mgr, factory, order, roots, ids, repeat):
+    """ Builds order repeat times for random samples of ids root IDs and
+    returns the measurements."""
+    rng = random.Random(0)
+    samples = [
+        rng.sample(range(roots), min(ids, roots)) for _ in range(repeat)
+    ]
+    factory.build(mgr, order, samples[0])
+
+    latencies = []
+    models = 0
+    for sample in samples:
+        start = time.perf_counter()
+        built = factory.build(mgr, order, sample)
+        latencies.append(time.perf_counter() - start)
+        models += count(built)
+
+    return {
+        'builds': repeat,
+        'models': models,
+        'mean': sum(latencies) / repeat,
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'throughput': models / sum(latencies),
+        'peak_memory': peak_memory(
+            lambda: factory.build(mgr, order, samples[0])
+        )
+    }
+
+
+def run(schemas, repeat=20, ids=100, workdir=None, log=print):
+    """ Runs the suite over schemas and returns the results by
+    'schema/shape' name."""
+    workdir = workdir or tempfile.mkdtemp(prefix='pycyqle-bench-')
+    results = {}
+    for name, (depth, fanout, roots, width) in schemas.items():
+        directory = os.path.join(workdir, name)
+        path, _ = schema.write(directory, depth, fanout, roots, width)
+        snapshot = os.path.join(directory, 'registry.snapshot')
+        compile_registry(directory, snapshot)
+        factory = load_registry(snapshot, {})['level0']
+        mgr = SQLiteConnector.build({'database': path})
+        for shape, order in shapes(depth, width).items():
+            key = '{}/{}'.format(name, shape)
+            results[key] = dict(
+                measure(mgr, factory, order, roots, ids, repeat),
+                depth=depth, fanout=fanout, roots=roots, width=width
+            )
+            log('{:<24} p50 {:>9.2f} ms  {:>10.0f} models/s'.format(
+                key, results[key]['p50'] * 1000, results[key]['throughput']
+            ))
+        mgr.close()
+    return results
+
+
+def metadata(repeat, ids):
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.now().replace(
+            microsecond=0
+        ).isoformat(),
+        'repeat': repeat,
+        'ids': ids
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('output', help='JSON file to write the results to')
+    parser.add_argument('--quick', action='store_true',
+                        help='use schemas with a tenth of the rows')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--ids', type=int, default=100,
+                        help='root IDs per build')
+    parser.add_argument('--workdir',
+                        help='where to generate schemas (a temporary '
+                             'directory by default)')
+    args = parser.parse_args(argv)
+
+    schemas = QUICK_SCHEMAS if args.quick else SCHEMAS
+    results = run(schemas, args.repeat, args.ids, args.workdir)
+    with open(args.output, 'w') as handle:
+        json.dump({
+            'meta': metadata(args.repeat, args.ids),
+            'results': results
+        }, handle, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+""" Row assemblers: functions generated for a factory and a list of
+components that turn fetched rows into models.
+
+An assembler does what a generic loop over rows and components would do,
+without looking up components, carriers or columns for every row. Tuple
+rows are unpacked positionally and carriers defined as plain methods of
+the model class are bound once, when the assembler is generated.
+"""
+
+import inspect
+import keyword
+import types
+
+_TEMPLATE = """
+def assemble(data, _map, ids, payloads):
+    for {row} in data:
+{prologue}
+        model = _map.get(_id)
+        if model is None:
+            model = _map[_id] = _new(_id)
+        ids[_id] = None
+{carriers}
+{payload}
+"""
+
+_PAYLOAD = """
+        models = payloads.get(_pid)
+        if models is None:
+            payloads[_pid] = [model]
+        else:
+            models.append(model)
+"""
+
+
+def _is_name(name):
+    return name.isidentifier() and not keyword.iskeyword(name)
+
+
+def _carrier_function(constructor, carrier):
+    """ Returns the plain function implementing carrier on constructor, or
+    None if it has to be looked up on every model."""
+    if not inspect.isclass(constructor):
+        return None
+
+    function = inspect.getattr_static(constructor, carrier, None)
+    return function if isinstance(function, types.FunctionType) else None
+
+
+def compile_assembler(constructor, components, parent, positional):
+    """ Returns a function assemble(data, _map, ids, payloads) that creates
+    or updates one model per row in data.
+
+    Models are looked up in, or created with constructor and added to,
+    _map. The ID of every row is added to the ids mapping and, when the
+    factory has a parent, every model is appended to the list of payloads
+    of its parent ID. Rows are tuples laid out as the factory's select
+    list (ID, parent ID, components) when positional is True, and
+    mappings from column aliases to values otherwise.
+    """
+    namespace = {'_new': constructor}
+    if positional:
+        names = ['_id'] + (['_pid'] if parent else [])
+        names += ['_v{}'.format(i) for i in range(len(components))]
+        row = ', '.join(names) + (',' if len(names) == 1 else '')
+        values = names[-len(components):] if components else []
+        prologue = []
+    else:
+        row = 'row'
+        values = ['row[{!r}]'.format(c.name()) for c in components]
+        prologue = ['_id = row["__id__"]']
+        if parent:
+            prologue.append('_pid = row["__pid__"]')
+
+    carriers = []
+    for index, (component, value) in enumerate(zip(components, values)):
+        carrier = component.carrier()
+        function = _carrier_function(constructor, carrier)
+        if function is not None:
+            namespace['_c{}'.format(index)] = function
+            carriers.append('_c{}(model, {})'.format(index, value))
+        elif _is_name(carrier):
+            carriers.append('model.{}({})'.format(carrier, value))
+        else:
+            carriers.append('getattr(model, {!r})({})'.format(carrier, value))
+
+    source = _TEMPLATE.format(
+        row=row,
+        prologue='\n'.join('        ' + line for line in prologue),
+        carriers='\n'.join('        ' + line for line in carriers),
+        payload=_PAYLOAD if parent else ''
+    )
+    exec(compile(source, '<assembler>', 'exec'), namespace)
+    return namespace['assemble']
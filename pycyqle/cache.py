@@ -0,0 +1,241 @@
+""" Caches that let factories reuse work across builds."""
+
+from collections import OrderedDict
+import re
+import sys
+import threading
+import time
+
+
+class LRUCache:
+    """ Size-bounded mapping that evicts the least recently used entry
+    once full and keeps track of hits and misses. If ttl is given, entries
+    expire ttl seconds after they are cached."""
+
+    def __init__(self, maxsize=128, ttl=None):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries and not self._expired(key)
+
+    def _expired(self, key):
+        expires = self._entries[key][1]
+        return expires is not None and time.monotonic() >= expires
+
+    def get(self, key, default=None):
+        """ Returns the value cached under key, or default on a miss."""
+        with self._lock:
+            if key in self._entries and self._expired(key):
+                self._delete(key)
+
+            if key not in self._entries:
+                self._misses += 1
+                return default
+
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        """ Caches value under key, evicting the oldest entries if the
+        cache grows beyond its maximum size."""
+        expires = None if self._ttl is None else time.monotonic() + self._ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while self._entries and self._full():
+                self._delete(next(iter(self._entries)))
+
+    def _full(self):
+        return self._maxsize is not None and len(self._entries) > self._maxsize
+
+    def _delete(self, key):
+        del self._entries[key]
+
+    def discard(self, predicate=None):
+        """ Removes every entry whose key satisfies predicate, or all of
+        them if no predicate is given. Returns the number of entries
+        removed."""
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if predicate is None or predicate(key)
+            ]
+            for key in keys:
+                self._delete(key)
+            return len(keys)
+
+    def stats(self):
+        """ Returns a dictionary with hit and miss counters."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': self._hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'maxsize': self._maxsize
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+
+
+class PlanCache(LRUCache):
+    """ Cache of compiled SQL, one entry per order-tree level.
+
+    Keys are (lineage, components, bind count) tuples where lineage is
+    the path of (factory, inventory name, strategy, predicates)
+    tuples from the root factory down to the level being compiled (see
+    context.Level). Everything that goes into a level's query text is
+    covered by the key: the ancestors determine the joins and nested
+    subqueries, the components determine the select list, the predicates
+    the filters and limits, and the bind values only matter through
+    their count. Queries compiled by another method than Factory.query,
+    such as Factory.links_query, add its name to the key.
+    """
+
+    def compile(self, key, compiler):
+        """ Returns the query cached under key, calling compiler to
+        produce and cache it on a miss."""
+        query = self.get(key)
+        if query is None:
+            query = compiler()
+            self.put(key, query)
+        return query
+
+    def invalidate(self, factory=None):
+        """ Drops every plan that involves factory, or all plans if no
+        factory is given."""
+        if factory is None:
+            return self.discard()
+
+        return self.discard(
+            lambda key: any(level[0] is factory for level in key[0])
+        )
+
+
+class ModelCache(LRUCache):
+    """ Cache of assembled root models shared across builds.
+
+    Keys are (factory, order key, primary key) tuples, where the order
+    key is the normalized order the model was built with (see
+    Factory.order_key), so a model is only served to builds asking for
+    the same components and inventory. Cached models are shared by every
+    build they are served to.
+    """
+
+    def invalidate(self, factory=None, ids=None):
+        """ Drops the cached models of factory, or of every factory if none
+        is given, restricted to the given primary keys if any. Returns the
+        number of models dropped."""
+        if ids is not None:
+            ids = set(ids if isinstance(ids, list) else [ids])
+
+        def _match(key):
+            _factory, _, _id = key
+            return (factory is None or _factory is factory) \
+                and (ids is None or _id in ids)
+
+        return self.discard(_match)
+
+
+class QueryCache(LRUCache):
+    """ Cache of query results shared by caching connectors (see
+    connectors.CachingConnector).
+
+    Keys are (query, binds) pairs where the query text has its whitespace
+    normalized outside string literals, so that queries differing only in
+    layout, such as subqueries nested at different depths, share their
+    entries. The cache is bounded by the approximate memory of the rows it
+    holds, maxbytes, besides the number of results, maxsize. Results are
+    tagged with the tables their query reads, for invalidate to drop them
+    once those tables change.
+    """
+
+    LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+    def __init__(self, maxbytes=64 << 20, maxsize=None, ttl=None):
+        super().__init__(maxsize, ttl)
+        self._maxbytes = maxbytes
+        self._bytes = 0
+        self._saved = 0
+        self._meta = {}
+
+    @staticmethod
+    def key(query, binds):
+        parts = QueryCache.LITERAL.split(query)
+        parts[::2] = [re.sub(r'\s+', ' ', part) for part in parts[::2]]
+        return ''.join(parts).strip(), tuple(sorted(
+            (name, repr(value)) for name, value in (binds or {}).items()
+        ))
+
+    @staticmethod
+    def sizeof(rows):
+        """ Returns the approximate number of bytes rows, a list of tuples,
+        take in memory."""
+        size = sys.getsizeof(rows)
+        for row in rows:
+            size += sys.getsizeof(row) + sum(map(sys.getsizeof, row))
+        return size
+
+    def get(self, key, default=None):
+        with self._lock:
+            hits = self._hits
+            value = super().get(key, default)
+            if self._hits > hits:
+                self._saved += self._meta[key][0]
+            return value
+
+    def put(self, key, value, size=0, tables=()):
+        """ Caches value, size bytes large, under key, tagged with the
+        names of the tables it was read from."""
+        with self._lock:
+            if key in self._entries:
+                self._delete(key)
+            self._meta[key] = (size, frozenset(t.lower() for t in tables))
+            self._bytes += size
+            super().put(key, value)
+
+    def _full(self):
+        return super()._full() or self._bytes > self._maxbytes
+
+    def _delete(self, key):
+        super()._delete(key)
+        self._bytes -= self._meta.pop(key)[0]
+
+    def invalidate(self, *tables):
+        """ Drops the results read from any of the given tables, or every
+        result if no table is given. Returns the number of results
+        dropped."""
+        if not tables:
+            return self.discard()
+
+        tables = {table.lower() for table in tables}
+        return self.discard(lambda key: self._meta[key][1] & tables)
+
+    def stats(self):
+        """ Returns the counters of LRUCache.stats along with the bytes
+        held and the bytes served from the cache instead of the database.
+        """
+        with self._lock:
+            return dict(
+                super().stats(), bytes=self._bytes, maxbytes=self._maxbytes,
+                bytes_saved=self._saved
+            )
+
+    def reset_stats(self):
+        with self._lock:
+            super().reset_stats()
+            self._saved = 0
@@ -0,0 +1,204 @@
+""" Conversion of fetched values according to component ctypes.
+
+Coercers convert a whole column of values at once, before rows are
+assembled into models, so carriers receive ready-made values instead of
+parsing what the driver returned row by row. NULLs are left untouched.
+
+ctypes may take an argument after a colon: 'enum:module.Class' converts
+values to members of that enum class. The default ctype, 'string', and
+unknown ctypes are left as they are. More ctypes can be added with
+register.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+import importlib
+import json
+import re
+
+COERCERS = {}
+
+ISO = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})'
+    r'(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?'
+    r'(?:([+-])(\d{2}):?(\d{2}))?)?$'
+)
+
+TRUE = frozenset(('1', 'true', 't', 'yes', 'y', 'on'))
+
+
+def register(ctype, convert, batch=False):
+    """ Registers convert for values of components of the given ctype.
+    convert takes a single value, or a list of values returning the list
+    of converted values if batch is True. Parametrized ctypes receive their
+    argument first, as in convert(argument, value)."""
+    COERCERS[ctype] = (convert, batch)
+
+
+def coercer(ctype):
+    """ Returns a function converting a list of values of ctype, or None if
+    values of ctype are left as they are."""
+    if not ctype:
+        return None
+
+    name, _, argument = ctype.partition(':')
+    if name not in COERCERS:
+        return None
+
+    convert, batch = COERCERS[name]
+    if argument:
+        resolved = _argument(argument)
+        convert = _bind(convert, resolved)
+    return convert if batch else _each(convert)
+
+
+def coerce_rows(data, coercers, positional):
+    """ Converts the values of rows in place, column by column, and returns
+    them. coercers maps column positions (for tuple rows) or aliases (for
+    mappings) to coercers."""
+    if not data or not coercers:
+        return data
+
+    if not positional:
+        for key, convert in coercers.items():
+            for row, value in zip(data, convert([row[key] for row in data])):
+                row[key] = value
+        return data
+
+    columns = list(zip(*data))
+    for index, convert in coercers.items():
+        columns[index] = convert(list(columns[index]))
+    return list(zip(*columns))
+
+
+def _each(convert):
+    def coerce(values):
+        if None in values:
+            return [None if v is None else convert(v) for v in values]
+        return list(map(convert, values))
+    return coerce
+
+
+def _bind(convert, argument):
+    return lambda value: convert(argument, value)
+
+
+def _argument(path):
+    module_name, _, name = path.rpartition('.')
+    return getattr(importlib.import_module(module_name), name)
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE
+    if isinstance(value, bytes):
+        return any(value)
+    return bool(value)
+
+
+def _decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(_text(value))
+
+
+def _isoformat(text):
+    """ Parses the ISO 8601 dates and times databases return, as
+    datetime.fromisoformat does on Python 3.7 and later."""
+    match = ISO.match(text)
+    if match is None:
+        raise ValueError('invalid isoformat string [{}]'.format(text))
+
+    year, month, day, hour, minute, second, fraction, sign, tz_hours, \
+        tz_minutes = match.groups()
+    tzinfo = None
+    if sign:
+        offset = timedelta(hours=int(tz_hours), minutes=int(tz_minutes))
+        tzinfo = timezone(-offset if sign == '-' else offset)
+    return datetime(
+        int(year), int(month), int(day), int(hour or 0), int(minute or 0),
+        int(second or 0), int((fraction or '0').ljust(6, '0')), tzinfo
+    )
+
+
+_parse_datetime = getattr(datetime, 'fromisoformat', _isoformat)
+_parse_date = getattr(
+    date, 'fromisoformat', lambda text: _isoformat(text).date()
+)
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return _parse_date(_text(value)[:10])
+
+
+def _datetime(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return _parse_datetime(_text(value))
+
+
+def _json(value):
+    if isinstance(value, (str, bytes, bytearray)):
+        return json.loads(_text(value))
+    return value
+
+
+def _enum(enum, value):
+    if isinstance(value, enum):
+        return value
+    try:
+        return enum(value)
+    except ValueError:
+        return enum[_text(value)]
+
+
+def _text(value):
+    return value.decode() if isinstance(value, (bytes, bytearray)) else value
+
+
+def _column(target, convert, fast):
+    """ Returns a batch coercer to target. Columns holding values of a
+    single type are returned as they are if it is target, or mapped
+    through the converter fast has for that type; other columns go
+    through convert value by value."""
+    slow = _each(convert)
+
+    def coerce(values):
+        kinds = set(map(type, values))
+        if len(kinds) == 1:
+            kind = kinds.pop()
+            if kind is target:
+                return values
+            if kind in fast:
+                try:
+                    return list(map(fast[kind], values))
+                except (TypeError, ValueError):
+                    pass
+        return slow(values)
+    return coerce
+
+
+def _register(ctypes, target, convert, fast):
+    for ctype in ctypes:
+        register(ctype, _column(target, convert, fast), batch=True)
+
+
+_register(('int', 'integer'), int, lambda value: int(_text(value)),
+          {str: int, float: int, Decimal: int})
+_register(('float', 'double'), float, lambda value: float(_text(value)),
+          {str: float, int: float, Decimal: float})
+_register(('decimal',), Decimal, _decimal, {str: Decimal, int: Decimal})
+_register(('bool', 'boolean'), bool, _bool, {int: bool})
+_register(('date',), date, _date, {str: _parse_date})
+_register(('datetime', 'timestamp'), datetime, _datetime,
+          {str: _parse_datetime})
+register('json', _json)
+register('enum', _enum)
@@ -0,0 +1,161 @@
+""" Columnar build results (see Factory.build_columnar).
+
+Columnar builds skip models altogether: every level of the order tree is
+returned as a set of column arrays, typed after the ctype of each
+component, and inventory levels carry offsets into their rows for every
+row of their parent level. NumPy is required (pip install pycyqle[numpy])
+and imported on the first columnar build.
+"""
+
+import importlib
+
+# NumPy dtypes of the component ctypes with a native representation;
+# other ctypes are kept in object arrays
+DTYPES = {
+    'int': 'int64',
+    'integer': 'int64',
+    'float': 'float64',
+    'double': 'float64',
+    'decimal': 'float64',
+    'bool': 'bool',
+    'boolean': 'bool',
+    'date': 'datetime64[D]',
+    'datetime': 'datetime64[us]',
+    'timestamp': 'datetime64[us]'
+}
+
+
+def _numpy():
+    try:
+        return importlib.import_module('numpy')
+    except ImportError:
+        raise ImportError('columnar builds require numpy')
+
+
+def array(values, ctype=None):
+    """ Returns values as an array of the dtype of ctype. Values that do
+    not fit it, such as NULLs in integer columns, fall back to an object
+    array."""
+    np = _numpy()
+    dtype = DTYPES.get(ctype)
+    if dtype is not None:
+        try:
+            return np.array(values, dtype=dtype)
+        except (TypeError, ValueError):
+            pass
+
+    result = np.empty(len(values), dtype=object)
+    result[:] = values
+    return result
+
+
+def keys(values):
+    """ Returns primary or parent key values as an int64 array if they are
+    all integers that fit it, otherwise as an object array."""
+    if all(type(value) is int for value in values):
+        try:
+            return _numpy().array(values, dtype='int64')
+        except OverflowError:
+            pass
+    return array(values)
+
+
+class Columns:
+    """ Rows of one level of a columnar build.
+    ids holds the primary key of every row (see keys) and columns maps
+    component names to their arrays. For inventory levels, the rows belonging to
+    row i of the parent level are those in offsets[i]:offsets[i + 1], and
+    parent_ids holds the parent ID of every row."""
+
+    def __init__(self, path, ids, columns, parent_ids=None, offsets=None):
+        self.path = path
+        self.ids = ids
+        self.columns = columns
+        self.parent_ids = parent_ids
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def children(self, index):
+        """ Returns the slice of rows belonging to row index of the parent
+        level."""
+        return slice(self.offsets[index], self.offsets[index + 1])
+
+    def nbytes(self):
+        arrays = [self.ids] + list(self.columns.values())
+        if self.offsets is not None:
+            arrays += [self.parent_ids, self.offsets]
+        return sum(a.nbytes for a in arrays)
+
+    @staticmethod
+    def from_rows(path, rows, names, ctypes, parent_ids=None):
+        """ Returns the columns of rows, tuples of ID, parent ID (if
+        parent_ids is given) and one value per name. Inventory rows are
+        laid out following the rows of their parent level, parent_ids."""
+        np = _numpy()
+        offsets = None
+        if parent_ids is not None:
+            groups = {}
+            for row in rows:
+                groups.setdefault(row[1], []).append(row)
+
+            laid_out = []
+            counts = []
+            for pid in parent_ids:
+                group = groups.get(pid, ())
+                laid_out.extend(group)
+                counts.append(len(group))
+            rows = laid_out
+            offsets = np.zeros(len(counts) + 1, dtype='int64')
+            np.cumsum(counts, out=offsets[1:])
+
+        width = len(names) + (1 if parent_ids is None else 2)
+        values = list(zip(*rows)) if rows else [()] * width
+        ids = keys(list(values[0]))
+        first = 1
+        pids = None
+        if parent_ids is not None:
+            pids = keys(list(values[1]))
+            first = 2
+
+        columns = {
+            name: array(list(column), ctypes[name])
+            for name, column in zip(names, values[first:])
+        }
+        return Columns(path, ids, columns, pids, offsets)
+
+    @staticmethod
+    def concat(parts):
+        """ Joins the columns of the same level built in several chunks.
+        Offsets of later chunks are shifted past the rows of earlier ones.
+        """
+        np = _numpy()
+        if len(parts) == 1:
+            return parts[0]
+
+        first = parts[0]
+        offsets = None
+        if first.offsets is not None:
+            shifted = [first.offsets]
+            total = first.offsets[-1]
+            for part in parts[1:]:
+                shifted.append(part.offsets[1:] + total)
+                total += part.offsets[-1]
+            offsets = np.concatenate(shifted)
+
+        return Columns(
+            first.path,
+            np.concatenate([part.ids for part in parts]),
+            {
+                name: np.concatenate([part.columns[name] for part in parts])
+                for name in first.columns
+            },
+            None if first.parent_ids is None else np.concatenate(
+                [part.parent_ids for part in parts]
+            ),
+            offsets
+        )
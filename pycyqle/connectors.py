@@ -1,20 +1,129 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import asyncio
 import getpass
+import importlib
+import re
+import sqlite3
+import threading
+import time
 
-import mysql.connector
+from .cache import QueryCache
+
+
+def fetch(mgr):
+    """ Returns the column names and the rows, as tuples in select order, of
+    the last query run on mgr.
+    Every connector returns the rows of the query it last executed as
+    dictionaries, through data(). Those that also have rows() return them
+    as tuples in select order, named by columns(), which spares building
+    a dictionary per row; connector wrappers provide both."""
+    if hasattr(mgr, 'rows'):
+        columns = list(mgr.columns())
+        # statements other than queries leave no result set to fetch
+        rows = [tuple(row) for row in mgr.rows()] if columns else []
+        return columns, rows
+
+    data = mgr.data() or []
+    columns = list(data[0]) if data else []
+    return columns, [tuple(row[c] for c in columns) for row in data]
+
+
+def slices(data, size):
+    """ Yields data in lists of at most size rows."""
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
 
 
 class MySQLConnector():
-    def __init__(self, conn):
+    """ Connector for MySQL databases.
+    With prepared=True, queries run as server-side prepared statements.
+    Each distinct query text keeps its own prepared cursor (up to
+    max_statements of them), so repeating a query skips parsing and
+    planning on the server."""
+
+    PLACEHOLDER = re.compile(r'%\((\w+)\)s')
+
+    def __init__(self, conn, prepared=False, max_statements=256):
         self._conn = conn
-        self._cursor = conn.cursor(dictionary=True)
+        self._prepared = prepared
+        self._max_statements = max_statements
+        self._statements = OrderedDict()
+        if prepared:
+            self._cursor = None
+        else:
+            self._cursor = conn.cursor()
 
     def execute(self, query, binds={}):
-        return self._cursor.execute(query, binds)
+        if not self._prepared:
+            return self._cursor.execute(query, binds)
+
+        names = MySQLConnector.PLACEHOLDER.findall(query)
+        self._cursor, statement = self._statement(query)
+        return self._cursor.execute(
+            statement,
+            tuple(binds[name] for name in names)
+        )
+
+    def _statement(self, query):
+        if query in self._statements:
+            self._statements.move_to_end(query)
+            return self._statements[query]
+
+        # prepared cursors only re-prepare when handed a different string
+        # object, so the translated text is kept alongside its cursor
+        statement = (
+            self._conn.cursor(prepared=True),
+            MySQLConnector.PLACEHOLDER.sub('%s', query)
+        )
+        self._statements[query] = statement
+        while len(self._statements) > self._max_statements:
+            _, (evicted, _) = self._statements.popitem(last=False)
+            evicted.close()
+
+        return statement
 
     def data(self):
+        columns = self.columns()
+        return [dict(zip(columns, row)) for row in self._cursor.fetchall()]
+
+    def rows(self):
         return self._cursor.fetchall()
 
+    def columns(self):
+        return self._cursor.column_names
+
+    def ping(self):
+        return self._conn.is_connected()
+
+    def reset(self):
+        """ Replaces the cursor, dropping any unread results. Prepared
+        statements are kept."""
+        if self._prepared:
+            self._cursor = None
+            return
+
+        self._cursor.close()
+        self._cursor = self._conn.cursor()
+
+    def stream(self, query, binds={}, size=1000):
+        """ Yields the rows of query in lists of at most size rows, reading
+        them from the server as they are consumed. The connection can not
+        run other queries until the stream is exhausted or closed."""
+        cursor = self._conn.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(query, binds)
+            rows = cursor.fetchmany(size)
+            while rows:
+                yield rows
+                rows = cursor.fetchmany(size)
+        finally:
+            cursor.close()
+
     def close(self):
+        for cursor, _ in self._statements.values():
+            cursor.close()
+        self._statements.clear()
         self._conn.close()
 
     @staticmethod
@@ -28,6 +137,488 @@ class MySQLConnector():
         return MySQLConnector.build(config)
 
     @staticmethod
-    def build(config):
+    def build(config, prepared=False):
+        # imported here so that importing pycyqle does not load the driver
+        import mysql.connector
         conn = mysql.connector.connect(**config)
-        return MySQLConnector(conn)
+        return MySQLConnector(conn, prepared)
+
+
+class SQLiteConnector():
+    """ Connector for SQLite databases. Queries compiled by factories use
+    pyformat placeholders, which are translated to SQLite's named style."""
+
+    PLACEHOLDER = re.compile(r'%\((\w+)\)s')
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursor = conn.cursor()
+
+    def execute(self, query, binds={}):
+        return self._cursor.execute(SQLiteConnector._statement(query), binds)
+
+    def data(self):
+        return SQLiteConnector._dicts(self._cursor, self._cursor.fetchall())
+
+    def rows(self):
+        return self._cursor.fetchall()
+
+    def columns(self):
+        return [column[0] for column in self._cursor.description or ()]
+
+    def ping(self):
+        try:
+            self._conn.execute('SELECT 1')
+        except sqlite3.Error:
+            return False
+        return True
+
+    def reset(self):
+        self._cursor.close()
+        self._cursor = self._conn.cursor()
+
+    def stream(self, query, binds={}, size=1000):
+        """ Yields the rows of query in lists of at most size rows."""
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute(SQLiteConnector._statement(query), binds)
+            rows = cursor.fetchmany(size)
+            while rows:
+                yield SQLiteConnector._dicts(cursor, rows)
+                rows = cursor.fetchmany(size)
+        finally:
+            cursor.close()
+
+    def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def _statement(query):
+        return SQLiteConnector.PLACEHOLDER.sub(r':\1', query)
+
+    @staticmethod
+    def _dicts(cursor, rows):
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+
+    @staticmethod
+    def build(config):
+        conn = sqlite3.connect(**config)
+        return SQLiteConnector(conn)
+
+
+# asyncio.current_task is new in Python 3.7
+_current_task = getattr(asyncio, 'current_task', None) \
+    or asyncio.Task.current_task
+
+
+class AsyncSQLiteConnector():
+    """ SQLite connector for asynchronous builds.
+    Its execute, data and close methods are coroutines. Queries run on the
+    event loop's default executor and their rows are kept per task, so
+    concurrent tasks sharing the connector each get their own results."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._results = {}
+
+    async def execute(self, query, binds={}):
+        loop = asyncio.get_event_loop()
+        self._results[_current_task()] = await loop.run_in_executor(
+            None, self._fetch, SQLiteConnector._statement(query), binds
+        )
+
+    def _fetch(self, statement, binds):
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute(statement, binds)
+            return SQLiteConnector._dicts(cursor, cursor.fetchall())
+        finally:
+            cursor.close()
+
+    async def data(self):
+        return self._results.pop(_current_task(), None)
+
+    async def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def build(config):
+        config = dict(config, check_same_thread=False)
+        return AsyncSQLiteConnector(sqlite3.connect(**config))
+
+
+class ConnectorConfig():
+    """ Picklable recipe for a connector, for worker processes that need
+    to open connections of their own. Calling it returns
+    connector.build(config, **options), where connector is a connector
+    class or the dotted path to one, so it can also be the factory of a
+    ConnectionPool."""
+
+    def __init__(self, connector, config, **options):
+        self.connector = connector
+        self.config = config
+        self.options = options
+
+    def __call__(self):
+        connector = self.connector
+        if isinstance(connector, str):
+            module_name, class_name = connector.rsplit('.', 1)
+            connector = getattr(importlib.import_module(module_name),
+                                class_name)
+        return connector.build(self.config, **self.options)
+
+
+class CachingConnector():
+    """ Connector wrapper that serves repeated reads from a QueryCache
+    (a new one unless given, which may be shared by several connectors)
+    instead of running them on mgr again. Results are tagged with the
+    tables named after FROM and JOIN in their query. Any other statement
+    runs on mgr and drops the cached results of the tables it names;
+    changes made behind the connector's back call for invalidate, e.g.
+    with the tables of a factory (see Factory.tables)."""
+
+    READ = re.compile(r'\s*(SELECT|WITH)\b', re.IGNORECASE)
+    TABLES = re.compile(
+        r'\b(?:FROM|JOIN|INTO|UPDATE)\s+([\w.]+)', re.IGNORECASE
+    )
+
+    def __init__(self, mgr, cache=None):
+        self._mgr = mgr
+        self.cache = QueryCache() if cache is None else cache
+        self._local = threading.local()
+
+    def execute(self, query, binds={}):
+        if not CachingConnector.READ.match(query):
+            self._local.result = None
+            try:
+                return self._mgr.execute(query, binds)
+            finally:
+                self.cache.invalidate(*CachingConnector.tables(query))
+
+        key = QueryCache.key(query, binds)
+        result = self.cache.get(key)
+        if result is None:
+            self._mgr.execute(query, binds)
+            result = fetch(self._mgr)
+            self.cache.put(
+                key, result, QueryCache.sizeof(result[1]),
+                CachingConnector.tables(query)
+            )
+        self._local.result = result
+
+    def data(self):
+        columns, rows = self._local.result
+        return [dict(zip(columns, row)) for row in rows]
+
+    def rows(self):
+        return list(self._local.result[1])
+
+    def columns(self):
+        return self._local.result[0]
+
+    def stream(self, query, binds={}, size=1000):
+        """ Yields the rows of query in lists of at most size rows, from
+        the cache if its result is cached. Otherwise the query is streamed
+        from mgr and its result is not cached, so that large results are
+        never held in memory at once."""
+        result = None
+        if CachingConnector.READ.match(query):
+            result = self.cache.get(QueryCache.key(query, binds))
+        if result is None:
+            for rows in self._mgr.stream(query, binds, size):
+                yield rows
+            return
+
+        columns, rows = result
+        for part in slices(rows, size):
+            yield [dict(zip(columns, row)) for row in part]
+
+    def invalidate(self, *tables):
+        """ Drops the cached results read from any of the given tables, or
+        all of them if no table is given."""
+        return self.cache.invalidate(*tables)
+
+    def stats(self):
+        return self.cache.stats()
+
+    def close(self):
+        self._mgr.close()
+
+    @staticmethod
+    def tables(query):
+        """ Returns the names of the tables query reads or writes."""
+        return {
+            name.split('.')[-1]
+            for name in CachingConnector.TABLES.findall(query)
+        }
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PoolClosed(Exception):
+    pass
+
+
+class ConnectionPool():
+    """ Pool of between min_size and max_size connectors, created on demand
+    by calling factory. Connectors are handed out by the connection()
+    context manager, which blocks while all of them are in use, raising
+    PoolTimeout after timeout seconds if one is given.
+
+    Idle connectors are checked with health_check (by default, their ping
+    method if they have one) before being handed out, and connectors older
+    than recycle seconds are closed and replaced, topping the pool up to
+    min_size again. Connectors are reset on return, so every checkout
+    starts with a fresh cursor. Checkouts from a closed pool raise
+    PoolClosed.
+    """
+
+    def __init__(self, factory, max_size=4, min_size=0, timeout=None,
+                 recycle=None, health_check=None):
+        if min_size > max_size:
+            raise ValueError('min_size > max_size')
+
+        self._factory = factory
+        self._max_size = max_size
+        self._min_size = min_size
+        self._timeout = timeout
+        self._recycle = recycle
+        self._health_check = health_check or ConnectionPool.ping
+        self._condition = threading.Condition()
+        self._idle = []
+        self._born = {}
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'checkout_time': 0.0,
+            'max_checkout_time': 0.0
+        }
+        for _ in range(min_size):
+            self._idle.append(self._create())
+
+    @contextmanager
+    def connection(self):
+        mgr = self._checkout()
+        try:
+            yield mgr
+        finally:
+            self._checkin(mgr)
+
+    def _checkout(self):
+        start = time.monotonic()
+        waited = False
+        while True:
+            with self._condition:
+                waited = self._wait(start) or waited
+                self._in_use += 1
+                mgr = self._idle.pop() if self._idle else None
+
+            if mgr is None:
+                try:
+                    mgr = self._create()
+                except Exception:
+                    self._release()
+                    raise
+            elif not self._healthy(mgr):
+                self._discard(mgr)
+                continue
+
+            elapsed = time.monotonic() - start
+            with self._condition:
+                self._stats['checkouts'] += 1
+                self._stats['waits'] += waited
+                self._stats['checkout_time'] += elapsed
+                self._stats['max_checkout_time'] = max(
+                    self._stats['max_checkout_time'], elapsed
+                )
+            return mgr
+
+    def _wait(self, start):
+        """ Waits, holding the condition, until a connector is idle or may
+        be created. Returns whether it had to wait."""
+        waited = False
+        while True:
+            if self._closed:
+                raise PoolClosed('pool is closed')
+            if self._idle or self._size() < self._max_size:
+                return waited
+
+            remaining = None
+            if self._timeout is not None:
+                remaining = start + self._timeout - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        'no connection available after {}s'.format(
+                            self._timeout
+                        )
+                    )
+            waited = True
+            self._condition.wait(remaining)
+
+    def _checkin(self, mgr):
+        if self._closed or self._expired(mgr):
+            self._discard(mgr)
+        elif not self._reset(mgr):
+            self._discard(mgr)
+        else:
+            with self._condition:
+                self._in_use -= 1
+                self._idle.append(mgr)
+                self._condition.notify()
+        self._refill()
+
+    @staticmethod
+    def _reset(mgr):
+        reset = getattr(mgr, 'reset', None)
+        try:
+            if reset:
+                reset()
+        except Exception:
+            return False
+        return True
+
+    def _create(self):
+        mgr = self._factory()
+        with self._condition:
+            self._born[id(mgr)] = time.monotonic()
+            self._stats['created'] += 1
+        return mgr
+
+    def _discard(self, mgr):
+        try:
+            mgr.close()
+        except Exception:
+            pass
+
+        with self._condition:
+            self._born.pop(id(mgr), None)
+            self._stats['discarded'] += 1
+        self._release()
+
+    def _refill(self):
+        """ Creates idle connectors until the pool holds min_size of them
+        again. Failures are left to the checkouts that need a connector."""
+        with self._condition:
+            missing = 0 if self._closed else self._min_size - self._size()
+            # counted as in use while they are created
+            self._in_use += max(missing, 0)
+
+        for _ in range(missing):
+            try:
+                mgr = self._create()
+            except Exception:
+                self._release()
+                continue
+
+            with self._condition:
+                self._in_use -= 1
+                self._idle.append(mgr)
+                self._condition.notify()
+
+    def _release(self):
+        with self._condition:
+            self._in_use -= 1
+            self._condition.notify()
+
+    def _size(self):
+        return self._in_use + len(self._idle)
+
+    def _expired(self, mgr):
+        if self._recycle is None:
+            return False
+
+        born = self._born.get(id(mgr), 0)
+        return time.monotonic() - born > self._recycle
+
+    def _healthy(self, mgr):
+        if self._expired(mgr):
+            return False
+
+        try:
+            return bool(self._health_check(mgr))
+        except Exception:
+            return False
+
+    @staticmethod
+    def ping(mgr):
+        ping = getattr(mgr, 'ping', None)
+        return ping() if ping else True
+
+    def stats(self):
+        """ Returns a dictionary with pool usage statistics."""
+        with self._condition:
+            stats = dict(self._stats)
+            stats['in_use'] = self._in_use
+            stats['idle'] = len(self._idle)
+            stats['avg_checkout_time'] = (
+                stats['checkout_time'] / stats['checkouts']
+                if stats['checkouts'] else 0.0
+            )
+            return stats
+
+    def close(self):
+        """ Closes the idle connectors. Connectors still in use are closed
+        as they are returned."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+
+        for mgr in idle:
+            with self._condition:
+                self._born.pop(id(mgr), None)
+            mgr.close()
+
+
+class PooledConnector():
+    """ Connector that runs every query on a connector checked out from a
+    pool and returns it as soon as the rows are fetched, so a single
+    PooledConnector can be shared by concurrent builds. It can also be
+    given as the pool of a parallel build."""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._local = threading.local()
+
+    def execute(self, query, binds={}):
+        with self._pool.connection() as mgr:
+            result = mgr.execute(query, binds)
+            self._local.result = fetch(mgr)
+        return result
+
+    def data(self):
+        columns, rows = self._local.result
+        return [dict(zip(columns, row)) for row in rows]
+
+    def rows(self):
+        return list(self._local.result[1])
+
+    def columns(self):
+        return self._local.result[0]
+
+    def stream(self, query, binds={}, size=1000):
+        with self._pool.connection() as mgr:
+            for rows in mgr.stream(query, binds, size):
+                yield rows
+
+    def connection(self):
+        return self._pool.connection()
+
+    def stats(self):
+        return self._pool.stats()
+
+    def close(self):
+        self._pool.close()
+
+    @staticmethod
+    def build(factory, **kwargs):
+        return PooledConnector(ConnectionPool(factory, **kwargs))
@@ -0,0 +1,188 @@
+""" Build-time state shared by every level of a single build."""
+
+import threading
+import time
+
+from .tracing import Span
+
+STRATEGIES = ('subquery', 'ids')
+
+
+class BuildContext:
+    """ Holds the data source, the model map and the options of a build
+    while it walks down the order tree.
+
+    strategy selects how inventory levels find their rows: 'subquery'
+    re-embeds the parent query in the child's WHERE clause, while 'ids'
+    binds the primary keys of the parent models fetched just before.
+    Inventory items may override it with their own strategy.
+
+    When a connection pool is given, inventory levels run their queries on
+    connectors checked out from it and sibling inventory items are loaded
+    concurrently. The lock guards the model map, which is shared by all
+    of them.
+
+    lazy defers loading every inventory item until it is first accessed
+    (see pycyqle.lazy), as if all of them were marked lazy, and coerce
+    converts fetched values after their ctypes (see pycyqle.coercion).
+    Every query is reported to tracer, if given (see pycyqle.tracing).
+    split loads every inventory item as if it was marked split, with
+    separate queries for parent-child links and for distinct children.
+    """
+
+    def __init__(self, mgr, model_map=None, chunk_size=None, bucket=None,
+                 strategy=None, pool=None, lazy=False, coerce=False,
+                 tracer=None, split=False):
+        if strategy is not None and strategy not in STRATEGIES:
+            raise ValueError('invalid strategy [{}]'.format(strategy))
+
+        self.mgr = mgr
+        self.model_map = {} if model_map is None else model_map
+        self.chunk_size = chunk_size
+        self.bucket = bucket
+        self.strategy = strategy or 'subquery'
+        self.pool = pool
+        self.lazy = lazy
+        self.coerce = coerce
+        self.tracer = tracer
+        self.split = split
+        # level whose models were processed before the build, see enrich
+        self.processed = None
+        # whether inventory items were handed to models as proxies
+        self.deferred = False
+        # IDs of the models processed so far, by level lineage
+        self.processed_ids = {}
+        self.lock = threading.RLock()
+
+    def fetch(self, query, binds, inventory=False, span=None):
+        """ Runs query and returns its rows, along with True if they are
+        tuples in select order (from connectors that provide rows()) or
+        False if they map column aliases to values. Inventory queries of
+        parallel builds hold a pooled connector only while they run.
+        Execute and fetch times are recorded in span, if given."""
+        if not inventory or self.pool is None:
+            return BuildContext._run(self.mgr, query, binds, span)
+
+        with self.pool.connection() as mgr:
+            return BuildContext._run(mgr, query, binds, span)
+
+    @staticmethod
+    def _run(mgr, query, binds, span=None):
+        start = time.perf_counter()
+        mgr.execute(query, binds)
+        executed = time.perf_counter()
+        if hasattr(mgr, 'rows'):
+            result = mgr.rows(), True
+        else:
+            result = mgr.data(), False
+
+        if span is not None:
+            span.execute_time = executed - start
+            span.fetch_time = time.perf_counter() - executed
+            span.rows = len(result[0])
+        return result
+
+    def unprocessed(self, level, ids):
+        """ Returns the IDs among ids whose models were not processed at
+        level yet, in an earlier chunk for instance, and marks them as
+        processed."""
+        done = self.processed_ids.setdefault(level.lineage(), set())
+        pending = [_id for _id in ids if _id not in done]
+        done.update(pending)
+        return pending
+
+    def span(self, level, query, binds):
+        """ Returns a Span for query if the build is traced, None
+        otherwise."""
+        if self.tracer is None:
+            return None
+
+        path = tuple(entry[1] for entry in level.lineage()[1:])
+        return Span(level.factory.name(), path, query, len(binds))
+
+    def trace(self, span):
+        if span is not None:
+            self.tracer.record(span)
+
+
+class Level:
+    """ Build-time view of a factory at one level of an order tree: its
+    parent level, the inventory item that leads to it and the strategy it
+    is loaded with, along with the filters, limit and sort its rows are
+    selected with (see pycyqle.filters). Builds keep this state here, so
+    the factories they walk through are never copied or modified.
+    Levels of lazy inventory items also collect the models delivered to
+    their parents in payloads."""
+
+    __slots__ = (
+        'factory', 'parent', 'inventory', 'strategy', 'filters', 'limit',
+        'sort', 'payloads'
+    )
+
+    def __init__(self, factory, parent=None, inventory=None, strategy=None,
+                 filters=(), limit=None, sort=()):
+        self.factory = factory
+        self.parent = parent
+        self.inventory = inventory
+        self.strategy = strategy
+        self.filters = tuple(filters)
+        self.limit = limit
+        self.sort = tuple(sort)
+        self.payloads = None
+
+    def depth(self):
+        return 0 if self.parent is None else self.parent.depth() + 1
+
+    def lineage(self):
+        """ Returns the (factory, inventory name, strategy, predicates)
+        tuples leading from the root level down to this one, where
+        predicates is what the SQL of the filters, limit and sort of the
+        level depends on, values aside. Factories are identified by the
+        object rather than by name, since registries may hold distinct
+        factories under the same name."""
+        predicates = None
+        if self.filters or self.limit is not None:
+            predicates = (
+                tuple(f.signature() for f in self.filters),
+                self.limit is not None,
+                self.sort
+            )
+
+        if self.parent is None:
+            return ((self.factory, None, None, predicates),)
+
+        return self.parent.lineage() + ((
+            self.factory, self.inventory.name(), self.strategy,
+            predicates
+        ),)
+
+    def clauses(self):
+        """ Returns the SQL conditions of the filters of this level along
+        with the values they bind."""
+        conditions = []
+        binds = {}
+        for index, _filter in enumerate(self.filters):
+            condition, _binds = _filter.compile(
+                self.factory, 'w{}_{}'.format(self.depth(), index)
+            )
+            conditions.append(condition)
+            binds.update(_binds)
+        return conditions, binds
+
+    def limit_bind(self):
+        return 'n{}'.format(self.depth())
+
+    def params(self, binds):
+        """ Returns binds along with the values bound by the filters and
+        limits of this level and of the levels above it, whose queries
+        inventory queries may embed. binds is returned as is if there are
+        none."""
+        params = binds if self.parent is None else self.parent.params(binds)
+        if not self.filters and self.limit is None:
+            return params
+
+        params = dict(params)
+        params.update(self.clauses()[1])
+        if self.limit is not None:
+            params[self.limit_bind()] = self.limit
+        return params
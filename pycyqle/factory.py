@@ -3,13 +3,24 @@ to be created from a relational database and a so-called 'order'
 that defines what the resulting models should be composed of.
 """
 
-from functools import reduce
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, reduce
 from operator import iconcat
-from copy import deepcopy
+import asyncio
+import base64
 import importlib
 import inspect
 import json
-from . import utils
+import time
+from . import coercion, sharding, utils
+from .assembler import compile_assembler
+from .cache import PlanCache
+from .columnar import Columns
+from .context import STRATEGIES, BuildContext, Level
+from .filters import Filter, sort_columns
+from .lazy import LazyList, LazyModel, Loader
+from .tracing import Span
 
 __author__ = "Bruno Lange"
 __license__ = "MIT"
@@ -34,9 +45,17 @@ class Factory:
     # Factories cache
     FACTORIES = {}
 
+    # Compiled queries cache, shared by all factories
+    PLANS = PlanCache(maxsize=1024)
+
+    # Order keys that configure a level rather than name inventory items
+    DIRECTIVES = ('__components__', '__filters__', '__limit__', '__sort__')
+
     def __init__(self):
+        self._name = None
         self._model = None
-        self._model_map = {}
+        # model class, resolved once from the model path
+        self._constructor = None
         # key-value mapper for factory components
         self._component_map = {}
         # key-value mapper for factory inventory
@@ -48,6 +67,15 @@ class Factory:
         self._alias = None
         self._processors = []
         self._filters = []
+        # row assemblers generated for this factory, see _assembler
+        self._assemblers = {}
+
+    def __getstate__(self):
+        # generated assemblers can not be pickled; workers regenerate them
+        state = dict(vars(self))
+        state['_assemblers'] = {}
+        state['_constructor'] = None
+        return state
 
     def name(self, *args):
         """ Fluent setter/getter for factory name."""
@@ -55,10 +83,14 @@ class Factory:
 
     def table(self, *args):
         """ Fluent setter/getter for factory table."""
+        if args:
+            self._invalidate_plans()
         return _fluent(self, '_table', *args)
 
     def alias(self, *args):
         """ Fluent setter/getter for factory table alias."""
+        if args:
+            self._invalidate_plans()
         return _fluent(self, '_alias', *args)
 
     def prefix(self):
@@ -67,10 +99,15 @@ class Factory:
 
     def primary_key(self, *args):
         """ Fluent setter/getter for factory table primary key."""
+        if args:
+            self._invalidate_plans()
         return _fluent(self, '_primary_key', *args)
 
     def model(self, *args):
-        """ Fluent setter/getter for factory model."""
+        """ Fluent setter/getter for factory model: a class or the dotted
+        path to one."""
+        if args:
+            self._constructor = None
         return _fluent(self, '_model', *args)
 
     def components(self, *args):
@@ -84,6 +121,8 @@ class Factory:
         for component in args[0]:
             self._component_map[component.name()] = component
 
+        self._assemblers = {}
+        self._invalidate_plans()
         return self
 
     def component(self, name):
@@ -101,6 +140,7 @@ class Factory:
 
         self._inventory_map = {inv.name(): inv for inv in args[0]}
 
+        self._invalidate_plans()
         return self
 
     def has_inventory_item(self, name):
@@ -119,7 +159,8 @@ class Factory:
 
         self._parent = {
             'factory': args[0],
-            'inventory': args[1]
+            'inventory': args[1],
+            'strategy': args[2] if len(args) > 2 else None
         }
         return self
 
@@ -128,26 +169,49 @@ class Factory:
         if not args:
             return self._order
 
-        self._order = Factory.standardize_order(args[0])
-        for component_name in self._order['__components__']:
+        self._order = self._checked_order(args[0])
+        return self
+
+    def _checked_order(self, order):
+        """ Returns the standardized order, making sure all of its
+        components belong to the factory."""
+        order = Factory.standardize_order(order)
+        for component_name in order['__components__']:
             if not self.has_component(component_name):
                 raise ValueError(
                     'invalid component [{}]'.format(component_name)
                 )
-        return self
+        return order
 
-    def process(self, *args):
+    def process(self, *args, batch=False, executor=None):
         """ If no arguments are passed, returns all processors registered.
         The last argument must be a callable value that takes a model as
-        its only argument. Any arguments before the callback set the path
-        to the factory which the processor should be attached to.
+        its only argument, or the list of models of a level if batch is
+        True. Any arguments before the callback set the path to the
+        factory which the processor should be attached to.
+        If an executor is given, the processor runs on it (see
+        utils.Processor).
         """
         if not args:
             return self._processors
 
         closure = args[-1]
         factory = self._navigate_to_factory(args[:-1])
-        factory._process(closure)
+        factory._process(closure, batch, executor)
+        return self
+
+    def filter(self, *args):
+        """ If no arguments are passed, returns all filters registered.
+        The last argument must be a filters.Filter or a [column, operator,
+        value] list, and any arguments before it set the path to the
+        factory which the filter should be attached to, as for process.
+        Factory filters apply to every build, before those of the order.
+        """
+        if not args:
+            return self._filters
+
+        factory = self._navigate_to_factory(args[:-1])
+        factory._filters.append(Filter.build(args[-1]))
         return self
 
     def _navigate_to_factory(self, path):
@@ -157,11 +221,42 @@ class Factory:
             self
         )
 
-    def _process(self, closure):
+    def _process(self, closure, batch=False, executor=None):
         if not callable(closure):
             raise ValueError('processor must be callable')
 
-        self._processors.append(utils.Processor(closure))
+        self._processors.append(utils.Processor(closure, batch, executor))
+
+    def processor_stats(self):
+        """ Returns the stats of the processors of this factory and of its
+        inventory, keyed by the path to their factory."""
+        stats = {}
+        for path, factory in self._walk():
+            if factory._processors:
+                stats[path] = [p.stats() for p in factory._processors]
+        return stats
+
+    def _walk(self, path=(), seen=None):
+        seen = set() if seen is None else seen
+        if id(self) in seen:
+            return
+
+        seen.add(id(self))
+        yield path, self
+        for name, inventory in self._inventory_map.items():
+            yield from inventory.factory()._walk(path + (name,), seen)
+
+    def tables(self):
+        """ Returns the names of the tables builds of this factory may
+        read: its own, those joined by its inventory items and those of
+        their factories."""
+        tables = set()
+        for _, factory in self._walk():
+            tables.add(factory.table())
+            for inventory in factory._inventory_map.values():
+                if inventory.join().table():
+                    tables.add(inventory.join().table())
+        return tables
 
     def validate(self):
         """ Returns a list with validation errors.
@@ -185,22 +280,103 @@ class Factory:
         # pylint: disable=no-member
         return model.__name__ if inspect.isclass(model) else model
 
-    def build(self, mgr, order, ids):
+    def build(self, mgr, order, ids, chunk_size=None, bucket=None,
+              strategy=None, pool=None, cache=None, lazy=False,
+              coerce=False, tracer=None, split=False):
         """ Returns a list of assembled models given a data source
-        and a list of IDs."""
-        self.order(order)
-        self._model_map = {}
-        self._build(mgr, self.order(), Factory.binds(ids), self._model_map)
+        and a list of IDs.
+        If chunk_size is given, the IDs are split into batches of at most
+        that many items and the whole order tree is built once per batch,
+        which keeps the IN lists bounded for very large ID sets.
+        If bucket is given, bind lists are padded up to bucket sizes (see
+        Factory.bucket_size) so that queries for similar numbers of IDs
+        share the same SQL text and, therefore, the same prepared plans.
+        strategy sets how inventory items without a strategy of their own
+        are loaded (see BuildContext).
+        If a connection pool is given, sibling inventory items are loaded
+        concurrently, each on its own connector from the pool.
+        If a ModelCache is given, root models built with the same order
+        before are served from it and only the missing IDs are built.
+        Models of builds that defer inventory items are not cached, since
+        their proxies load on this build's connector.
+        If lazy is True, every inventory item is loaded on first access,
+        as for inventory items marked lazy; mgr must stay open until then.
+        If coerce is True, fetched values are converted after the ctype of
+        their components (see pycyqle.coercion) before assembly.
+        If a tracer is given, it receives a span for every query (see
+        pycyqle.tracing).
+        If split is True, every inventory item is loaded as those marked
+        split are: with one query for the links between parent and child
+        IDs and another one for the distinct children.
+        """
+        order = self._checked_order(order)
+        ctx = BuildContext(
+            mgr, None, chunk_size, bucket, strategy, pool, lazy, coerce,
+            tracer, split
+        )
+        level = self._level(order)
+        pending = ids
+        if cache is not None and ids:
+            pending = self._cached(ctx, cache, order, ids)
+
+        if pending is ids or pending:
+            for chunk in Factory.chunks(pending, chunk_size):
+                self._build(ctx, level, order, Factory.binds(chunk, bucket))
+
+        if cache is not None and pending and not ctx.deferred:
+            self._cache(ctx, cache, order, pending)
+
+        return self._collect(ctx.model_map, ids)
+
+    def _cached(self, ctx, cache, order, ids):
+        """ Puts the cached root models for ids in the model map and
+        returns the IDs that are missing from the cache."""
+        key = Factory.order_key(order)
+        _map = ctx.model_map.setdefault(self.model_key(), {})
+        pending = OrderedDict()
+        for _id in ids if isinstance(ids, list) else [ids]:
+            model = cache.get((self, key, _id))
+            if model is None:
+                pending[_id] = None
+            else:
+                _map[_id] = model
+        return list(pending)
+
+    def _cache(self, ctx, cache, order, ids):
+        key = Factory.order_key(order)
+        _map = ctx.model_map[self.model_key()]
+        for _id in ids:
+            if _id in _map:
+                cache.put((self, key, _id), _map[_id])
+
+    async def abuild(self, mgr, order, ids, chunk_size=None, bucket=None,
+                     strategy=None, coerce=False):
+        """ Coroutine counterpart of build for connectors whose execute
+        and data methods are coroutines. Sibling inventory items are
+        awaited concurrently."""
+        order = self._checked_order(order)
+        ctx = BuildContext(
+            mgr, None, chunk_size, bucket, strategy, coerce=coerce
+        )
+        level = self._level(order)
+        for chunk in Factory.chunks(ids, chunk_size):
+            await self._abuild(
+                ctx, level, order, Factory.binds(chunk, bucket)
+            )
+        return self._collect(ctx.model_map, ids)
+
+    def _collect(self, model_map, ids):
+        """ Returns the root models of a build in the order of ids."""
         model_key = self.model_key()
         if not ids:
-            models = self._model_map[model_key].values()
+            models = model_map[model_key].values()
         else:
             if not isinstance(ids, list):
                 ids = [ids]
 
             models = [
-                self._model_map[model_key][_id] for _id in ids
-                if _id in self._model_map[model_key]
+                model_map[model_key][_id] for _id in ids
+                if _id in model_map[model_key]
             ]
 
         if ids is None or isinstance(ids, list):
@@ -211,89 +387,554 @@ class Factory:
 
         return models[0]
 
-    def _build(self, mgr, order, binds, model_map):
+    def iter_build(self, mgr, order, ids=None, batch_size=1000,
+                   inventory_mgr=None, strategy=None, coerce=False):
+        """ Yields lists of at most batch_size assembled models given a
+        data source and an optional list of IDs.
+        Root rows are streamed from mgr and each batch has its inventory
+        built before it is yielded, so memory use is bounded by the batch
+        size rather than by the size of the table. Drivers that cannot run
+        a query while another one is still streaming (e.g. MySQL) need a
+        separate inventory_mgr for the inventory queries."""
+        order = self._checked_order(order)
+        level = self._level(order)
+        binds = Factory.binds(ids)
+        query = self._plan(level, order['__components__'], binds)
+        for data in mgr.stream(query, level.params(binds), batch_size):
+            ctx = BuildContext(
+                inventory_mgr or mgr, strategy=strategy, coerce=coerce
+            )
+            batch = list(OrderedDict.fromkeys(row['__id__'] for row in data))
+            self._load(ctx, level, order, Factory.binds(batch), data)
+            yield [ctx.model_map[self.model_key()][_id] for _id in batch]
+
+    def paginate(self, mgr, order, page_size, after=None, strategy=None,
+                 coerce=False, tracer=None):
+        """ Builds the next page of at most page_size root models, walking
+        the whole table in primary key order, and returns it along with the
+        cursor token of the page that follows, None after the last one.
+        after is the token returned with the previous page, the first page
+        being built if it is None. Pages are found by keyset rather than by
+        offset, so every page costs the same however far the scan went, and
+        tokens are plain strings that let interrupted scans resume from
+        another process. The options are those of build."""
+        if page_size < 1:
+            raise ValueError('invalid page size [{}]'.format(page_size))
+
+        order = self._checked_order(order)
+        level = self._level(order)
+        if level.parent or level.limit is not None:
+            raise ValueError('only unlimited root levels can be paginated')
+
+        binds = {'page_size': page_size}
+        if after is not None:
+            binds['after'] = self._resume(after)
+
+        ctx = BuildContext(mgr, strategy=strategy, coerce=coerce,
+                           tracer=tracer)
+        query = self._plan(
+            level, order['__components__'], binds, self.page_query
+        )
+        span = ctx.span(level, query, binds)
+        data, positional = ctx.fetch(query, level.params(binds), span=span)
+        if not data:
+            ctx.trace(span)
+            return [], None
+
+        ids = [row[0] if positional else row['__id__'] for row in data]
+        self._load(
+            ctx, level, order, Factory.binds(ids), data, positional, span
+        )
+        token = self._cursor(ids[-1]) if len(ids) == page_size else None
+        return self._collect(ctx.model_map, ids), token
+
+    def _cursor(self, last):
+        """ Returns the cursor token for the rows after primary key last.
+        """
+        state = json.dumps({'factory': self.name(), 'after': last})
+        return base64.urlsafe_b64encode(state.encode()).decode()
+
+    def _resume(self, token):
+        """ Returns the primary key the cursor token was issued for."""
+        try:
+            state = json.loads(
+                base64.urlsafe_b64decode(token.encode()).decode()
+            )
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError('invalid cursor token [{}]'.format(token))
+
+        if not isinstance(state, dict) or state.get('factory') != self.name():
+            raise ValueError('cursor token of another factory')
+        return state['after']
+
+    def build_sharded(self, config, order, ids, processes=None,
+                      executor=None, columnar=False, **options):
+        """ Builds ids in processes shards built in parallel by worker
+        processes, each on a connector of its own opened from config, a
+        connectors.ConnectorConfig. Returns the models in the order of ids,
+        as build does, or the columns of every level, as build_columnar
+        does, if columnar is True. The remaining options are passed on to
+        either (see pycyqle.sharding)."""
+        return sharding.build(
+            self, config, order, ids, processes, executor, columnar,
+            **options
+        )
+
+    def build_columnar(self, mgr, order, ids, chunk_size=None, bucket=None,
+                       strategy=None):
+        """ Returns the rows of every level of order as column arrays,
+        without creating any models.
+        The result maps the path of inventory names leading to each level
+        (the empty tuple for this factory) to a columnar.Columns instance.
+        Columns are typed after the ctype of their component and inventory
+        levels carry offsets into their rows for every row of their parent
+        level. The options are those of build."""
+        order = self._checked_order(order)
+        ctx = BuildContext(mgr, None, chunk_size, bucket, strategy)
+        level = self._level(order)
+        parts = OrderedDict()
+        for chunk in Factory.chunks(ids, chunk_size):
+            self._build_columns(
+                ctx, level, order, Factory.binds(chunk, bucket), parts
+            )
+        return {path: Columns.concat(part) for path, part in parts.items()}
+
+    def _build_columns(self, ctx, level, order, binds, parts, path=(),
+                       parent_ids=None):
+        names = order['__components__']
+        if parent_ids is None:
+            batches = [binds]
+        elif len(parent_ids):
+            ids = list(OrderedDict.fromkeys(parent_ids.tolist()))
+            batches = Factory._branch_binds(ctx, level, binds, ids)
+        else:
+            batches = []
+
+        rows = []
+        for _binds in batches:
+            rows += self._fetch_rows(ctx, level, names, _binds)
+
+        ctypes = {name: self.component(name).ctype() for name in names}
+        columns = Columns.from_rows(path, rows, names, ctypes, parent_ids)
+        parts.setdefault(path, []).append(columns)
+        for child, components in self._branches(ctx, level, order):
+            child.factory._build_columns(
+                ctx, child, components, binds, parts,
+                path + (child.inventory.name(),), columns.ids
+            )
+
+    def _fetch_rows(self, ctx, level, names, binds):
+        """ Returns the rows of this level as tuples in select order."""
+        query = self._plan(level, names, binds)
+        data, positional = ctx.fetch(
+            query, level.params(binds), level.parent is not None
+        )
+        if positional:
+            return data
+
+        keys = ['__id__'] + (['__pid__'] if level.parent else []) + names
+        return [tuple(row[key] for key in keys) for row in data]
+
+    def enrich(self, mgr, models, order, key=None, chunk_size=None,
+               bucket=None, strategy=None, pool=None, coerce=False,
+               tracer=None, process=False):
+        """ Loads the components and inventory items in order into models
+        built before and returns them as a list.
+        models is either a dictionary of IDs to models or an iterable of
+        models, in which case key must return the ID of each of them. Only
+        the IDs and the ordered components are selected, and the values are
+        assigned to the existing models through their carriers; inventory
+        items in order are built as usual and handed to them. Since the
+        models were processed when they were built, this factory's own
+        processors only run on them again if process is True; those of
+        the inventory items always run. The remaining options are those of
+        build."""
+        if key is not None:
+            models = OrderedDict((key(model), model) for model in models)
+        elif not isinstance(models, dict):
+            raise ValueError('models must be keyed by ID or a key given')
+
+        order = self._checked_order(order)
+        ctx = BuildContext(
+            mgr, {self.model_key(): dict(models)}, chunk_size, bucket,
+            strategy, pool, coerce=coerce, tracer=tracer
+        )
+        level = self._level(order)
+        if not process:
+            ctx.processed = level
+        for chunk in Factory.chunks(list(models), chunk_size):
+            self._build(ctx, level, order, Factory.binds(chunk, bucket))
+        return list(models.values())
+
+    def _level(self, order=None):
+        """ Returns the build-time view of this factory for order, placed
+        under the parent set through Factory.parent, if any."""
+        if not self._parent:
+            return Level(self, **self._predicates(order))
+
+        return Level(
+            self,
+            self._parent['factory']._level(),
+            self._parent['inventory'],
+            self._parent['strategy'],
+            **self._predicates(order)
+        )
+
+    def _predicates(self, order=None):
+        """ Returns the filters, limit and sort of this factory's level for
+        order: the factory's own filters followed by those of order."""
+        order = order or {}
+        limit = order.get('__limit__')
+        if limit is not None and (
+                isinstance(limit, bool) or not isinstance(limit, int)
+                or limit < 0):
+            raise ValueError('invalid limit [{}]'.format(limit))
+
+        return {
+            'filters': self._filters + [
+                Filter.build(value) for value in order.get('__filters__', ())
+            ],
+            'limit': limit,
+            'sort': order.get('__sort__', ())
+        }
+
+    def _build(self, ctx, level, order, binds):
         if not order:
             return
 
-        if inspect.isclass(self.model()):
-            model_constructor = self.model()
+        if not self.model_key() in ctx.model_map:
+            ctx.model_map[self.model_key()] = {}
+
+        if level.parent and (ctx.split or level.inventory.split()):
+            return self._build_split(ctx, level, order, binds)
+
+        query = self._plan(level, order['__components__'], binds)
+        span = ctx.span(level, query, binds)
+        data, positional = ctx.fetch(
+            query, level.params(binds), inventory=level.parent is not None,
+            span=span
+        )
+        self._load(ctx, level, order, binds, data, positional, span)
+
+    def _build_split(self, ctx, level, order, binds):
+        """ Loads an inventory level with a narrow query for the distinct
+        (child ID, parent ID) pairs its join yields and queries for the
+        distinct children by ID, instead of transferring every column of
+        a child once per parent it is linked to. The rows the join would
+        have returned are then stitched together in memory."""
+        query = self._plan(level, None, binds, self.links_query)
+        span = ctx.span(level, query, binds)
+        links, positional = ctx.fetch(query, level.params(binds), True, span)
+        ctx.trace(span)
+        if not positional:
+            links = [(row['__id__'], row['__pid__']) for row in links]
+
+        components = order['__components__']
+        root = Level(self)
+        rows = {}
+        span = None
+        for chunk in Factory.chunks(
+                list(OrderedDict.fromkeys(_id for _id, _ in links)),
+                ctx.chunk_size):
+            _binds = Factory.binds(chunk, ctx.bucket)
+            query = self._plan(root, components, _binds)
+            chunk_span = ctx.span(level, query, _binds)
+            data, positional = ctx.fetch(query, _binds, True, chunk_span)
+            span = Span.merge(span, chunk_span)
+            for row in data:
+                rows[row[0] if positional else row['__id__']] = row
+
+        if positional:
+            data = [
+                (_id, p_id) + rows[_id][1:]
+                for _id, p_id in links if _id in rows
+            ]
         else:
-            module_name, class_name = self.model().rsplit('.', 1)
-            model_constructor = getattr(
-                importlib.import_module(module_name),
-                class_name
-            )
+            data = [
+                dict(rows[_id], __pid__=p_id)
+                for _id, p_id in links if _id in rows
+            ]
+        self._load(ctx, level, order, binds, data, positional, span)
+
+    def _load(self, ctx, level, order, binds, data, positional=False,
+              span=None):
+        """ Assembles models out of the rows fetched for this level and
+        builds their inventory. The span of the query, if traced, is
+        completed and reported once they are delivered."""
+        if not data:
+            ctx.trace(span)
+            return
 
-        if not self.model_key() in model_map:
-            model_map[self.model_key()] = {}
+        clock = time.perf_counter
+        start = clock()
+        if ctx.coerce:
+            data = self._coerce(level, order['__components__'], data,
+                                positional)
+
+        with ctx.lock:
+            assembly = clock()
+            known = len(ctx.model_map.get(self.model_key(), ()))
+            ids, payloads = self._assemble(
+                level, order['__components__'], data, ctx.model_map,
+                positional
+            )
+            created = len(ctx.model_map[self.model_key()]) - known
+            assembled = clock()
+        self._build_inventory(ctx, level, order, binds, ids)
+
+        with ctx.lock:
+            processing = clock()
+            if level is not ctx.processed:
+                self._run_processors(
+                    ctx.unprocessed(level, ids), ctx.model_map
+                )
+            processed = clock()
+            self._deliver(level, payloads, ctx.model_map)
+
+        if span is not None:
+            span.created = created
+            span.reused = len(ids) - created
+            span.coercion_time = assembly - start
+            span.assembly_time = assembled - assembly
+            span.processor_time = processed - processing
+            ctx.trace(span)
+
+    async def _abuild(self, ctx, level, order, binds):
+        if not order:
+            return
 
-        query = self.query(order['__components__'], binds, 0)
-        mgr.execute(query, binds)
-        data = mgr.data()
+        if not self.model_key() in ctx.model_map:
+            ctx.model_map[self.model_key()] = {}
 
+        query = self._plan(level, order['__components__'], binds)
+        await ctx.mgr.execute(query, level.params(binds))
+        data = await ctx.mgr.data()
         if not data:
             return
 
-        components = self._get_order_components(order['__components__'])
+        if ctx.coerce:
+            data = self._coerce(level, order['__components__'], data, False)
+
+        ids, payloads = self._assemble(
+            level, order['__components__'], data, ctx.model_map
+        )
+        await asyncio.gather(*[
+            child.factory._abuild_branch(ctx, child, components, binds, ids)
+            for child, components in self._branches(ctx, level, order)
+        ])
+
+        self._run_processors(ctx.unprocessed(level, ids), ctx.model_map)
+        self._deliver(level, payloads, ctx.model_map)
+
+    async def _abuild_branch(self, ctx, level, order, binds, ids):
+        for _binds in Factory._branch_binds(ctx, level, binds, ids):
+            await self._abuild(ctx, level, order, _binds)
+
+    def _model_constructor(self):
+        """ Returns the model class, importing it the first time it is
+        needed if the model is given as a dotted path."""
+        if self._constructor is None:
+            model = self.model()
+            if not inspect.isclass(model):
+                module_name, class_name = model.rsplit('.', 1)
+                model = getattr(importlib.import_module(module_name),
+                                class_name)
+            self._constructor = model
+        return self._constructor
+
+    def _assemble(self, level, names, data, model_map, positional=False):
+        """ Creates or updates one model per row. Returns the IDs of the
+        models in the order they were first seen along with the models
+        grouped by parent ID. Rows are tuples in select order if positional
+        is True and mappings from column aliases to values otherwise."""
+        assembler = self._assembler(
+            tuple(names), level.parent is not None, positional
+        )
+        ids = OrderedDict()
         payloads = {}
-        _map = model_map[self.model_key()]
-        for row in data:
-            _id = row['__id__']
-            if _id in _map:
-                model = _map[_id]
-            else:
-                model = model_constructor(_id)
-                _map[_id] = model
+        assembler(
+            data, model_map.setdefault(self.model_key(), {}), ids, payloads
+        )
+        return list(ids), payloads
+
+    def _coerce(self, level, names, data, positional):
+        """ Converts the values of the fetched rows after the ctypes of
+        their components, one column at a time."""
+        offset = 1 if level.parent is None else 2
+        coercers = {}
+        for index, name in enumerate(names):
+            convert = coercion.coercer(self.component(name).ctype())
+            if convert is not None:
+                coercers[offset + index if positional else name] = convert
+        return coercion.coerce_rows(data, coercers, positional)
+
+    def _assembler(self, names, parent, positional):
+        """ Returns the row assembler for the given component names,
+        generating it the first time it is needed."""
+        constructor = self._model_constructor()
+        key = (names, parent, positional, constructor)
+        assembler = self._assemblers.get(key)
+        if assembler is None:
+            assembler = compile_assembler(
+                constructor, self._get_order_components(names), parent,
+                positional
+            )
+            self._assemblers[key] = assembler
+        return assembler
 
-            for component in components:
-                value = row[component.name()]
-                carrier = getattr(model, component.carrier())
-                carrier(value)
+    def _run_processors(self, ids, model_map):
+        """ Runs the processors on the models assembled for this level."""
+        if not self._processors:
+            return
 
-            for processor in self._processors:
-                processor.attach(model)
+        _map = model_map[self.model_key()]
+        models = [_map[_id] for _id in ids]
+        for processor in self._processors:
+            processor.run(models)
+
+    def _build_inventory(self, ctx, level, order, binds, ids):
+        """ Builds the inventory items named in the order. Items loaded
+        with the 'ids' strategy bind the given IDs of this level's models,
+        chunked as configured, instead of re-running this level's query.
+        Parallel builds load sibling items on separate threads and lazy
+        items are handed to the models as proxies.
+        """
+        branches = []
+        for child, components in self._branches(ctx, level, order):
+            if ctx.lazy or child.inventory.lazy():
+                self._defer(ctx, child, components, binds, ids)
+                continue
+
+            branches.append(partial(
+                child.factory._build_branch, ctx, child, components, binds,
+                ids
+            ))
 
-            if self.parent():
-                p_id = row['__pid__']
-                if p_id not in payloads:
-                    payloads[p_id] = []
+        if ctx.pool is None or len(branches) < 2:
+            for branch in branches:
+                branch()
+            return
 
-                payloads[p_id].append(model)
+        with ThreadPoolExecutor(max_workers=len(branches)) as executor:
+            futures = [executor.submit(branch) for branch in branches]
+            for future in futures:
+                future.result()
 
-        del order['__components__']
+    def _branches(self, ctx, level, order):
+        """ Yields the level of every inventory item in order, placed under
+        the given level, along with the order to build it with."""
         for key, components in order.items():
+            if key in Factory.DIRECTIVES:
+                continue
+
             if not self.has_inventory_item(key):
                 raise Exception('inventory item not defined')
 
             inv = self.inventory(key)
-            fac = deepcopy(inv.factory())
-            fac.parent(self, inv)
-            fac._build(mgr, components, binds, model_map)
+            strategy = inv.strategy() or ctx.strategy
+            factory = inv.factory()
+            yield Level(
+                factory, level, inv, strategy,
+                **factory._predicates(components)
+            ), components
+
+    def _defer(self, ctx, level, order, binds, ids):
+        """ Hands a proxy for the inventory item of level to every model
+        with the given IDs. The first proxy accessed builds the item for
+        all of them."""
+        inventory = level.inventory
+        ctx.deferred = True
+
+        def _load():
+            level.payloads = {}
+            level.factory._build_branch(ctx, level, order, binds, ids)
+            return level.payloads
+
+        loader = Loader(_load)
+        proxy = LazyModel if inventory.single() else LazyList
+        _map = ctx.model_map[self.model_key()]
+        for _id in ids:
+            getattr(_map[_id], inventory.carrier())(proxy(loader, _id))
+
+    def _build_branch(self, ctx, level, order, binds, ids):
+        for _binds in Factory._branch_binds(ctx, level, binds, ids):
+            self._build(ctx, level, order, _binds)
 
-        for processor in self._processors:
-            processor.run()
-
-        if self.parent():
-            parent = self.parent()
-            factory = parent['factory']
-            inventory = parent['inventory']
-            carrier = inventory.carrier()
-            parent_map = model_map[factory.model_key()]
+    @staticmethod
+    def _branch_binds(ctx, level, binds, ids):
+        """ Returns the binds each query of an inventory level runs with:
+        the parent's binds, or chunks of the parent IDs for the 'ids'
+        strategy."""
+        if level.strategy != 'ids':
+            return [binds]
+
+        return [
+            Factory.binds(chunk, ctx.bucket)
+            for chunk in Factory.chunks(ids, ctx.chunk_size)
+        ]
+
+    def _deliver(self, level, payloads, model_map):
+        """ Hands the models grouped by parent ID over to the parent
+        models through the inventory carrier."""
+        if not level.parent:
+            return
+
+        if level.payloads is not None:
             for p_id, models in payloads.items():
-                if p_id in parent_map:
-                    parent_model = parent_map[p_id]
-                    _carrier = getattr(parent_model, carrier)
-                    _carrier(models[0] if inventory.single() else models)
+                level.payloads.setdefault(p_id, []).extend(models)
+
+        inventory = level.inventory
+        carrier = inventory.carrier()
+        parent_map = model_map[level.parent.factory.model_key()]
+        for p_id, models in payloads.items():
+            if p_id in parent_map:
+                parent_model = parent_map[p_id]
+                _carrier = getattr(parent_model, carrier)
+                _carrier(models[0] if inventory.single() else models)
+
+    def _plan(self, level, components, binds, compiler=None):
+        """ Returns the query for this level of the order tree, served
+        from the plan cache whenever the same shape was compiled before.
+        Queries are compiled by compiler(components, binds, depth, level),
+        Factory.query by default, whose name is part of the key otherwise.
+        """
+        key = (
+            level.lineage(), None if components is None else tuple(components),
+            len(binds)
+        )
+        if compiler is not None:
+            key += (compiler.__name__,)
+
+        compiler = compiler or self.query
+        return Factory.PLANS.compile(
+            key, lambda: compiler(components, binds, 0, level)
+        )
+
+    def _invalidate_plans(self):
+        Factory.PLANS.invalidate(self)
+
+    def query(self, components, binds, depth=0, level=None):
+        """ Compiles the query for the given components. level places the
+        factory in an order tree; by default, it sits under the parent set
+        through Factory.parent, if any."""
+        if level is None:
+            level = self._level()
 
-    def query(self, components, binds, depth=0):
         query = [
-            'SELECT {}'.format(self._compile_select(components)),
+            'SELECT {}'.format(self._compile_select(components, level)),
             'FROM {}'.format(self._compile_table())
         ]
-        if self.parent():
-            query.append(self._compile_join())
+        if level.parent:
+            query.append(self._compile_join(level))
 
-        query.append('WHERE {}'.format(self._compile_where(binds, depth)))
+        query.append('WHERE {}'.format(
+            self._compile_where(binds, depth, level)
+        ))
+        if level.limit is not None:
+            query = self._compile_limit(
+                query, self._ranked_columns(components, level), level,
+                ordered=components is not None
+            )
 
         tabs = '    '*depth
         return '{}{}'.format(
@@ -301,14 +942,53 @@ class Factory:
             '\n{}'.format(tabs).join(query)
         )
 
-    def _compile_select(self, components):
-        if components is not None:
+    def page_query(self, components, binds, depth, level):
+        """ Compiles the query for a page of rows in primary key order: at
+        most as many as the 'page_size' bind, past the primary key bound as
+        'after', if any."""
+        pk = '{}.{}'.format(self.prefix(), self.primary_key() or 'ROWID')
+        conditions, _ = level.clauses()
+        if 'after' in binds:
+            conditions.insert(0, '{} > %(after)s'.format(pk))
+
+        query = [
+            'SELECT {}'.format(self._compile_select(components, level)),
+            'FROM {}'.format(self._compile_table()),
+            'WHERE {}'.format(' AND '.join(conditions) or '1=1'),
+            'ORDER BY {}'.format(pk),
+            'LIMIT %(page_size)s'
+        ]
+        return '\n'.join(query)
+
+    def links_query(self, components, binds, depth, level):
+        """ Compiles the query for the distinct pairs of IDs and parent IDs
+        of an inventory level, used by split inventory items. components
+        is ignored."""
+        query = [
+            'SELECT DISTINCT {}\n,    {}'.format(
+                self._column_query('"__id__"'),
+                level.parent.factory._column_query('"__pid__"')
+            ),
+            'FROM {}'.format(self._compile_table()),
+            self._compile_join(level),
+            'WHERE {}'.format(self._compile_where(binds, depth, level))
+        ]
+        if level.limit is not None:
+            query = self._compile_limit(
+                query, 'ranked.__id__, ranked.__pid__', level, ordered=True
+            )
+        return '\n'.join(query)
+
+    def _compile_select(self, components, level):
+        if components is not None or level.limit is not None:
             select = [self._column_query('"__id__"')]
         else:
             select = ['DISTINCT {}'.format(self._column_query())]
 
-        if components and self.parent():
-            select.append(self.parent()['factory']._column_query('"__pid__"'))
+        if components and level.parent:
+            select.append(
+                level.parent.factory._column_query('"__pid__"')
+            )
 
         if components:
             select += list(map(
@@ -325,29 +1005,72 @@ class Factory:
 
         return _from
 
-    def _compile_join(self):
-        parent = self.parent()
-        inventory = parent['inventory']
-        join = inventory.join()
+    def _compile_join(self, level):
+        return level.inventory.join().compile()
+
+    def _compile_limit(self, query, columns, level, ordered=False):
+        """ Wraps the lines of query so that only the first level.limit
+        rows after level.sort are selected, for every parent ID in
+        inventory levels, and returns the lines of the outer query. The
+        outer query refers to the inner columns unquoted, since MySQL reads
+        double-quoted names as strings."""
+        partition = ''
+        if level.parent:
+            partition = 'PARTITION BY {} '.format(
+                level.parent.factory._column_query()
+            )
 
-        return join.compile()
+        rank = 'ROW_NUMBER() OVER ({}ORDER BY {}) AS __rank__'.format(
+            partition, ', '.join(sort_columns(self, level.sort))
+        )
+        query[0] += '\n,    ' + rank
+        outer = ['SELECT {}'.format(columns), 'FROM ('] + query + [
+            ') ranked',
+            'WHERE ranked.__rank__ <= %({})s'.format(level.limit_bind())
+        ]
+        if ordered:
+            outer.append('ORDER BY ranked.__rank__')
+        return outer
 
-    def _compile_where(self, binds, depth=0):
-        if not binds:
-            return '1=1'
+    @staticmethod
+    def _ranked_columns(components, level):
+        if components is None:
+            return 'DISTINCT ranked.__id__'
+
+        columns = ['__id__']
+        if components and level.parent:
+            columns.append('__pid__')
+        return ', '.join(
+            'ranked.' + column for column in columns + list(components)
+        )
 
-        if not self.parent():
+    def _compile_where(self, binds, depth, level):
+        conditions, _ = level.clauses()
+        if binds:
+            conditions.insert(0, self._compile_ids(binds, depth, level))
+
+        return ' AND '.join(conditions) or '1=1'
+
+    def _compile_ids(self, binds, depth, level):
+        if not level.parent:
             return '{prefix}.{pk} IN ({binds})'.format(
                 prefix=self.prefix(),
                 pk=self.primary_key() if self.primary_key() else 'ROWID',
-                binds=','.join('%(id{})s'.format(i) for i in range(len(binds)))
+                binds=Factory._compile_binds(binds)
+            )
+
+        parent_factory = level.parent.factory
+        if level.strategy == 'ids':
+            return '{table}.{pk} IN ({binds})'.format(
+                table=parent_factory.table(),
+                pk=parent_factory.primary_key() or 'ROWID',
+                binds=Factory._compile_binds(binds)
             )
 
-        parent_factory = self.parent()['factory']
         return '{table}.{pk} IN (\n{query}\n{depth})'.format(
             table=parent_factory.table(),
             pk=parent_factory.primary_key() or 'ROWID',
-            query=parent_factory.query(None, binds, depth+1),
+            query=parent_factory.query(None, binds, depth+1, level.parent),
             depth='   '*depth
         )
 
@@ -369,6 +1092,10 @@ class Factory:
             names
         ))
 
+    @staticmethod
+    def _compile_binds(binds):
+        return ','.join('%(id{})s'.format(i) for i in range(len(binds)))
+
     @staticmethod
     def bind_reducer(binds, item):
         index = len(binds)
@@ -376,15 +1103,74 @@ class Factory:
         return binds
 
     @staticmethod
-    def binds(ids):
+    def chunks(ids, size=None):
+        """ Splits ids into lists of at most size items. Single IDs, None
+        and lists that fit in one chunk are yielded untouched."""
+        if not size or not isinstance(ids, list) or len(ids) <= size:
+            yield ids
+            return
+
+        for start in range(0, len(ids), size):
+            yield ids[start:start + size]
+
+    @staticmethod
+    def binds(ids, bucket=None):
         if ids is None:
             return []
 
         if not isinstance(ids, list):
             ids = [ids]
 
+        if bucket and ids:
+            # repeating an ID leaves the IN clause semantics untouched
+            padding = Factory.bucket_size(len(ids), bucket) - len(ids)
+            ids = ids + [ids[-1]] * padding
+
         return reduce(Factory.bind_reducer, ids, {})
 
+    @staticmethod
+    def bucket_size(count, bucket):
+        """ Returns the number of binds a list of count IDs is padded to.
+        bucket may be True (next power of two), an integer (next multiple
+        of that integer) or a callable mapping counts to sizes."""
+        if callable(bucket):
+            size = bucket(count)
+        elif bucket is True:
+            size = 1 << (count - 1).bit_length()
+        else:
+            size = -(-count // bucket) * bucket
+
+        if size < count:
+            raise ValueError('bucket size {} < {}'.format(size, count))
+
+        return size
+
+    @staticmethod
+    def order_key(order):
+        """ Returns a hashable key for order that does not depend on the
+        order in which components and inventory items are listed."""
+        order = Factory.standardize_order(order)
+        return (
+            tuple(sorted(set(order['__components__']))),
+            tuple(sorted(
+                (key, Factory.order_key(value))
+                for key, value in order.items()
+                if key not in Factory.DIRECTIVES
+            )),
+            tuple(
+                (key, Factory._freeze(order[key]))
+                for key in Factory.DIRECTIVES[1:] if key in order
+            )
+        )
+
+    @staticmethod
+    def _freeze(value):
+        if isinstance(value, Filter):
+            return value.key()
+        if isinstance(value, (list, tuple)):
+            return tuple(map(Factory._freeze, value))
+        return value
+
     @staticmethod
     def standardize_order(order):
         if not isinstance(order, dict):
@@ -395,7 +1181,7 @@ class Factory:
             if isinstance(key, int):
                 std_order['__components__'].append(value)
             else:
-                if key == '__components__':
+                if key in Factory.DIRECTIVES:
                     std_order[key] = value
                 else:
                     std_order[key] = Factory.standardize_order(value)
@@ -408,18 +1194,21 @@ class Factory:
             return Factory.from_dict(json.load(handle))
 
     @staticmethod
-    def from_dict(dic):
+    def from_dict(dic, resolve=None, registry=None, validate=True):
+        """ Returns the factory described by dic.
+        The factories of its inventory items are obtained by calling
+        resolve with their 'factory' property, which defaults to reading
+        them with Factory.from_json. Factories are cached by name in
+        registry, Factory.FACTORIES unless given."""
+        registry = Factory.FACTORIES if registry is None else registry
         factory_name = dic['name']
-        if factory_name in Factory.FACTORIES:
-            return Factory.FACTORIES[factory_name]
-
-        if 'inventory' not in dic:
-            dic['inventory'] = {}
+        if factory_name in registry:
+            return registry[factory_name]
 
         factory = Factory()
         factory.name(factory_name)
 
-        Factory.FACTORIES[factory_name] = factory
+        registry[factory_name] = factory
 
         (
             factory
@@ -427,13 +1216,18 @@ class Factory:
             .primary_key(dic['primary_key'])
             .model(dic['model'])
             .components(Factory.build_components(dic['components']))
-            .inventory_items(Factory.build_inventory(dic['inventory']))
+            .inventory_items(
+                Factory.build_inventory(dic.get('inventory', {}), resolve)
+            )
         )
 
         if 'alias' in dic:
             factory.alias(dic['alias'])
 
-        errors = factory.validate()
+        for value in dic.get('filters', []):
+            factory.filter(value)
+
+        errors = factory.validate() if validate else []
         if errors:
             raise Exception('invalid factory -> {}'.format(errors))
 
@@ -492,15 +1286,20 @@ class Factory:
         ]
 
     @staticmethod
-    def build_inventory(inventory_map):
+    def build_inventory(inventory_map, resolve=None):
+        resolve = resolve or Factory.from_json
+
         def _mapper(name, properties):
             return (
                 Inventory()
                 .name(name)
-                .factory(Factory.from_json(properties['factory']))
+                .factory(resolve(properties['factory']))
                 .join(Factory.build_join(properties['join']))
                 .carrier(properties['carrier'])
                 .single(properties.get('single', False))
+                .strategy(properties.get('strategy'))
+                .lazy(properties.get('lazy', False))
+                .split(properties.get('split', False))
             )
 
         return [
@@ -552,6 +1351,9 @@ class Inventory:
         self._factory = None
         self._inventory_map = {}
         self._single = False
+        self._strategy = None
+        self._lazy = False
+        self._split = False
 
     def inventory(self, *args):
         if not args:
@@ -578,6 +1380,18 @@ class Inventory:
     def single(self, *args):
         return _fluent(self, '_single', *args)
 
+    def lazy(self, *args):
+        return _fluent(self, '_lazy', *args)
+
+    def split(self, *args):
+        return _fluent(self, '_split', *args)
+
+    def strategy(self, *args):
+        if args and args[0] is not None and args[0] not in STRATEGIES:
+            raise ValueError('invalid strategy [{}]'.format(args[0]))
+
+        return _fluent(self, '_strategy', *args)
+
     def factory(self, *args):
         if not args:
             return self._factory
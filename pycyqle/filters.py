@@ -0,0 +1,150 @@
+""" Predicates compiled into the WHERE clause of a level's query.
+
+Filters apply to one factory's table, either permanently, when attached
+with Factory.filter, or for one build, when listed under '__filters__'
+in the order tree. Orders may also cap the rows of a level with
+'__limit__', sorted by the '__sort__' columns (the primary key unless
+given; a leading '-' sorts in descending order). The limit applies to
+every parent separately in inventory levels:
+
+    {
+        '__components__': ['tire'],
+        'wheels': {
+            '__components__': ['size'],
+            '__filters__': [['size', '>=', 27]],
+            '__limit__': 1,
+            '__sort__': ['-size']
+        }
+    }
+
+Values are always bound, never inlined in the SQL.
+"""
+
+OPERATORS = (
+    '=', '!=', '<>', '<', '<=', '>', '>=', 'LIKE', 'NOT LIKE', 'IN',
+    'NOT IN', 'IS NULL', 'IS NOT NULL'
+)
+
+UNARY = ('IS NULL', 'IS NOT NULL')
+
+LISTS = ('IN', 'NOT IN')
+
+
+def _fluent(obj, attr, *args):
+    if args:
+        setattr(obj, attr, args[0])
+        return obj
+    return getattr(obj, attr)
+
+
+class Filter:
+    """ Predicate comparing a column, or the column of a component, to a
+    value: Filter().column('size').operator('>').value(26)."""
+
+    def __init__(self):
+        self._column = None
+        self._operator = '='
+        self._value = None
+
+    def column(self, *args):
+        if args and not str(args[0]).isidentifier():
+            raise ValueError('invalid filter column [{}]'.format(args[0]))
+
+        return _fluent(self, '_column', *args)
+
+    def operator(self, *args):
+        if args:
+            operator = ' '.join(str(args[0]).upper().split())
+            if operator not in OPERATORS:
+                raise ValueError('invalid filter operator [{}]'.format(
+                    args[0]
+                ))
+            args = (operator,)
+
+        return _fluent(self, '_operator', *args)
+
+    def value(self, *args):
+        if args and self._operator in LISTS:
+            args = (list(args[0]),)
+
+        return _fluent(self, '_value', *args)
+
+    def signature(self):
+        """ Returns what the compiled SQL depends on: the column, the
+        operator and the number of values of list operators."""
+        count = len(self._value) if self._operator in LISTS else None
+        return (self._column, self._operator, count)
+
+    def key(self):
+        """ Returns a hashable description of the filter, values included.
+        """
+        value = self._value
+        if isinstance(value, list):
+            value = tuple(value)
+        return self.signature() + (value,)
+
+    def compile(self, factory, name):
+        """ Returns the SQL of the filter on factory's table, with its
+        placeholders named after name, along with their binds."""
+        column = '{}.{}'.format(factory.prefix(), column_of(
+            factory, self._column
+        ))
+        if self._operator in UNARY:
+            return '{} {}'.format(column, self._operator), {}
+
+        if self._operator in LISTS:
+            if not self._value:
+                # nothing is IN an empty list, everything is NOT IN it
+                return '1=0' if self._operator == 'IN' else '1=1', {}
+            names = ['{}_{}'.format(name, i) for i in range(len(self._value))]
+            binds = dict(zip(names, self._value))
+            placeholders = ','.join('%({})s'.format(n) for n in names)
+            return '{} {} ({})'.format(
+                column, self._operator, placeholders
+            ), binds
+
+        return '{} {} %({})s'.format(column, self._operator, name), {
+            name: self._value
+        }
+
+    @staticmethod
+    def build(value):
+        """ Returns value if it is a Filter, or the filter described by a
+        [column, operator, value] list (without the value for IS NULL and
+        IS NOT NULL)."""
+        if isinstance(value, Filter):
+            return value
+
+        column, operator = value[0], value[1]
+        _filter = Filter().column(column).operator(operator)
+        if len(value) > 2:
+            _filter.value(value[2])
+        return _filter
+
+
+def column_of(factory, name):
+    """ Returns the column of the component name, or name itself if the
+    factory has no such component."""
+    if factory.has_component(name):
+        return factory.component(name).column()
+    return name
+
+
+def sort_columns(factory, sort):
+    """ Returns the ORDER BY terms for the sort names of factory, its
+    primary key if there are none."""
+    if not sort:
+        return [factory._column_query()]
+
+    terms = []
+    for name in sort:
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        if not name.isidentifier():
+            raise ValueError('invalid sort column [{}]'.format(name))
+
+        terms.append('{}.{}{}'.format(
+            factory.prefix(), column_of(factory, name),
+            ' DESC' if descending else ''
+        ))
+    return terms
@@ -0,0 +1,87 @@
+""" Proxies handed to inventory carriers by lazy builds.
+
+A lazy inventory item is not loaded while its parent level is built.
+Instead, every parent model receives a proxy, and the first proxy to be
+accessed loads the item for all the parent models of that level in one
+go, so unused inventory costs nothing and used inventory does not cost
+one query per model.
+"""
+
+from collections.abc import Sequence
+import threading
+
+
+class Loader:
+    """ Loads an inventory item for all the models of a build level the
+    first time its payloads are requested."""
+
+    def __init__(self, load):
+        self._load = load
+        self._payloads = None
+        self._lock = threading.Lock()
+
+    def loaded(self):
+        return self._payloads is not None
+
+    def payloads(self):
+        """ Returns the loaded models grouped by parent ID."""
+        with self._lock:
+            if self._payloads is None:
+                self._payloads = self._load()
+        return self._payloads
+
+
+class LazyList(Sequence):
+    """ Stands in for the list of models of a parent model."""
+
+    def __init__(self, loader, key):
+        self._loader = loader
+        self._key = key
+
+    def _models(self):
+        return self._loader.payloads().get(self._key, [])
+
+    def __getitem__(self, index):
+        return self._models()[index]
+
+    def __len__(self):
+        return len(self._models())
+
+    def __iter__(self):
+        return iter(self._models())
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        if not self._loader.loaded():
+            return '<LazyList (not loaded)>'
+        return repr(self._models())
+
+
+class LazyModel:
+    """ Stands in for the single model of a parent model, forwarding
+    attribute access to it once loaded."""
+
+    def __init__(self, loader, key):
+        object.__setattr__(self, '_loader', loader)
+        object.__setattr__(self, '_key', key)
+
+    def resolve(self):
+        """ Returns the model, or None if the parent model has none."""
+        models = self._loader.payloads().get(self._key)
+        return models[0] if models else None
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    def __bool__(self):
+        return self.resolve() is not None
+
+    def __repr__(self):
+        if not self._loader.loaded():
+            return '<LazyModel (not loaded)>'
+        return repr(self.resolve())
@@ -0,0 +1,213 @@
+""" Recorded query results, for builds without a database.
+
+RecordingConnector wraps a live connector and keeps the columns, rows
+and timings of every query it runs, which Recording.save writes to a
+compact file. ReplayConnector serves them back for the same queries and
+binds, optionally with the recorded or a fixed latency, so builds can be
+profiled and regression-tested deterministically on machines without
+access to the database:
+
+    mgr = RecordingConnector(MySQLConnector.build(config))
+    factory.build(mgr, order, ids)
+    mgr.recording.save('bicycles.rec')
+
+    factory.build(ReplayConnector.build('bicycles.rec'), order, ids)
+
+Recordings are pickled so that values keep their types (dates, decimals
+and so on); only replay recordings from trusted sources.
+"""
+
+import gzip
+import pickle
+import threading
+import time
+
+from .connectors import fetch, slices
+
+VERSION = 1
+
+
+class ReplayMiss(Exception):
+    """ Raised when replaying a query that was not recorded."""
+
+
+class Result:
+    """ Recorded result of one query: column names, rows as tuples in
+    select order and the seconds spent executing the query and fetching
+    its rows."""
+
+    __slots__ = ('columns', 'rows', 'execute_time', 'fetch_time')
+
+    def __init__(self, columns, rows, execute_time=0.0, fetch_time=0.0):
+        self.columns = columns
+        self.rows = rows
+        self.execute_time = execute_time
+        self.fetch_time = fetch_time
+
+    def data(self):
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+
+class Recording:
+    """ Results of the queries of one or more runs, keyed by query text and
+    binds. A query run several times keeps every result in order."""
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(results) for results in self._results.values())
+
+    @staticmethod
+    def key(query, binds):
+        return query, tuple(sorted(
+            (name, repr(value)) for name, value in (binds or {}).items()
+        ))
+
+    def add(self, query, binds, result):
+        with self._lock:
+            self._results.setdefault(
+                Recording.key(query, binds), []
+            ).append(result)
+
+    def results(self, query, binds):
+        """ Returns the results recorded for query and binds, raising
+        ReplayMiss if there are none."""
+        results = self._results.get(Recording.key(query, binds))
+        if not results:
+            raise ReplayMiss('query not recorded:\n{}\n{}'.format(
+                query, binds
+            ))
+        return results
+
+    def save(self, path):
+        with self._lock:
+            entries = [
+                (key, [
+                    (r.columns, r.rows, r.execute_time, r.fetch_time)
+                    for r in results
+                ])
+                for key, results in self._results.items()
+            ]
+        with gzip.open(path, 'wb') as handle:
+            pickle.dump(
+                {'version': VERSION, 'entries': entries}, handle,
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+
+    @staticmethod
+    def load(path):
+        with gzip.open(path, 'rb') as handle:
+            state = pickle.load(handle)
+        if state.get('version') != VERSION:
+            raise ValueError('unsupported recording version [{}]'.format(
+                state.get('version')
+            ))
+
+        recording = Recording()
+        for key, results in state['entries']:
+            recording._results[key] = [Result(*r) for r in results]
+        return recording
+
+
+class RecordingConnector:
+    """ Connector wrapper that records the result of every query run on
+    mgr in recording (a new one unless given). Rows are read as soon as a
+    query runs, so that fetching is timed too."""
+
+    def __init__(self, mgr, recording=None):
+        self._mgr = mgr
+        self.recording = Recording() if recording is None else recording
+        self._local = threading.local()
+
+    def execute(self, query, binds={}):
+        start = time.perf_counter()
+        result = self._mgr.execute(query, binds)
+        executed = time.perf_counter()
+        columns, rows = fetch(self._mgr)
+        recorded = Result(
+            columns, rows, executed - start, time.perf_counter() - executed
+        )
+        self.recording.add(query, binds, recorded)
+        self._local.result = recorded
+        return result
+
+    def data(self):
+        return self._local.result.data()
+
+    def rows(self):
+        return self._local.result.rows
+
+    def columns(self):
+        return self._local.result.columns
+
+    def stream(self, query, binds={}, size=1000):
+        self.execute(query, binds)
+        for rows in slices(self.data(), size):
+            yield rows
+
+    def close(self):
+        self._mgr.close()
+
+
+class ReplayConnector:
+    """ Connector serving the results of a recording. A query run more
+    times than it was recorded gets its last result again.
+    latency is None to answer right away, a number of seconds to wait
+    for every query, or 'recorded' to wait as long as the query took when
+    it was recorded. Replaying is thread-safe: every thread reads its own
+    results."""
+
+    def __init__(self, recording, latency=None):
+        if latency is not None and latency != 'recorded' \
+                and not isinstance(latency, (int, float)):
+            raise ValueError('invalid latency [{}]'.format(latency))
+
+        self.recording = recording
+        self._latency = latency
+        self._replays = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.queries = 0
+
+    def execute(self, query, binds={}):
+        results = self.recording.results(query, binds)
+        key = Recording.key(query, binds)
+        with self._lock:
+            index = self._replays.get(key, 0)
+            self._replays[key] = index + 1
+            self.queries += 1
+        result = results[min(index, len(results) - 1)]
+
+        if self._latency == 'recorded':
+            time.sleep(result.execute_time + result.fetch_time)
+        elif self._latency:
+            time.sleep(self._latency)
+        self._local.result = result
+
+    def data(self):
+        return self._local.result.data()
+
+    def rows(self):
+        return list(self._local.result.rows)
+
+    def columns(self):
+        return self._local.result.columns
+
+    def stream(self, query, binds={}, size=1000):
+        self.execute(query, binds)
+        for rows in slices(self.data(), size):
+            yield rows
+
+    def rewind(self):
+        """ Starts serving every query from its first result again."""
+        with self._lock:
+            self._replays = {}
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def build(path, latency=None):
+        return ReplayConnector(Recording.load(path), latency)
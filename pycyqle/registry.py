@@ -0,0 +1,108 @@
+""" Registry snapshots: every factory of a project in a single file.
+
+Reading factories with Factory.from_json opens and parses one JSON file
+per factory, following inventory items from file to file, and validates
+each of them. compile_registry does all of that once, ahead of time, and
+writes the definitions to a snapshot where inventory items refer to
+their factory by name. load_registry then builds every factory from one
+read, skipping validation, and resolves their model classes up front so
+that builds never import them.
+
+    python -m pycyqle.registry factories/ registry.json
+"""
+
+import argparse
+import glob
+import json
+import os
+
+from .factory import Factory
+
+VERSION = 1
+
+
+def compile_registry(directory, path):
+    """ Writes a snapshot of the factory JSON files in directory, and of
+    those their inventory items refer to, to path. The factories are
+    built once to make sure they are valid. Returns their names."""
+    definitions = {}
+    names = {}
+
+    def _name(filename):
+        filename = os.path.abspath(_locate(filename, directory))
+        if filename not in names:
+            with open(filename, 'r') as handle:
+                dic = json.load(handle)
+            names[filename] = dic['name']
+            definitions[dic['name']] = dic
+            for item in dic.get('inventory', {}).values():
+                item['factory'] = _name(item['factory'])
+        return names[filename]
+
+    for filename in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        _name(filename)
+
+    build_registry(definitions, {}, validate=True, resolve_models=False)
+    with open(path, 'w') as handle:
+        json.dump({'version': VERSION, 'factories': definitions}, handle)
+    return sorted(definitions)
+
+
+def load_registry(path, registry=None, resolve_models=True):
+    """ Builds every factory in the snapshot at path and returns them by
+    name. They are also cached in registry, Factory.FACTORIES unless
+    given: env_build then returns them without reading any file, while
+    Factory.from_json still reads and parses its file before returning
+    the cached factory of the same name, so look factories up by name
+    rather than loading them from JSON again."""
+    with open(path, 'r') as handle:
+        snapshot = json.load(handle)
+
+    if snapshot.get('version') != VERSION:
+        raise ValueError(
+            'unsupported registry version [{}]'.format(snapshot.get('version'))
+        )
+
+    registry = Factory.FACTORIES if registry is None else registry
+    return build_registry(
+        snapshot['factories'], registry, resolve_models=resolve_models
+    )
+
+
+def build_registry(definitions, registry, validate=False,
+                   resolve_models=True):
+    """ Builds the factories defined in definitions, where inventory items
+    refer to their factory by name."""
+    def _resolve(name):
+        return Factory.from_dict(definitions[name], _resolve, registry,
+                                 validate)
+
+    factories = {name: _resolve(name) for name in definitions}
+    if resolve_models:
+        for factory in factories.values():
+            factory._model_constructor()
+    return factories
+
+
+def _locate(filename, directory):
+    """ Inventory items name their factory file as given to from_json;
+    files that are not found from the working directory are looked up in
+    directory."""
+    if os.path.exists(filename):
+        return filename
+    return os.path.join(directory, os.path.basename(filename))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='compile factory JSON files into a registry snapshot'
+    )
+    parser.add_argument('directory')
+    parser.add_argument('snapshot')
+    args = parser.parse_args(argv)
+    for name in compile_registry(args.directory, args.snapshot):
+        print(name)
+
+
+if __name__ == '__main__':
+    main()
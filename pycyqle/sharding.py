@@ -0,0 +1,74 @@
+""" Builds sharded over worker processes (see Factory.build_sharded).
+
+Assembling models is pure Python and holds the GIL, so one build keeps a
+single core busy however many IDs it is given. Sharded builds partition
+the IDs into contiguous shards and build each of them in a worker
+process, on a connector the worker opens from a picklable
+connectors.ConnectorConfig. The factory and the order are pickled to the
+workers and the results back, so models and processors must be
+picklable; columnar results are much cheaper to send back than models.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import os
+
+from .columnar import Columns
+
+
+def shards(ids, count):
+    """ Splits ids into at most count contiguous lists of sizes that differ
+    by one at most."""
+    count = max(1, min(count, len(ids)))
+    size, extra = divmod(len(ids), count)
+    result = []
+    start = 0
+    for index in range(count):
+        end = start + size + (1 if index < extra else 0)
+        result.append(ids[start:end])
+        start = end
+    return result
+
+
+def build_shard(factory, config, order, ids, columnar=False, options=None):
+    """ Builds one shard on a connector of its own, in a worker process."""
+    mgr = config()
+    try:
+        build = factory.build_columnar if columnar else factory.build
+        return build(mgr, order, ids, **(options or {}))
+    finally:
+        mgr.close()
+
+
+def build(factory, config, order, ids, processes=None, executor=None,
+          columnar=False, **options):
+    """ Builds ids in processes shards (one per core by default) and
+    returns the models of all of them in the order of ids, or their
+    columns merged per level if columnar is True. Shards are built on
+    executor if one is given, otherwise on a pool of one worker per shard
+    created for the occasion. Full-table builds (ids None or empty) and
+    builds of a single ID given as a scalar are not sharded."""
+    if ids and isinstance(ids, list):
+        parts = shards(ids, processes or os.cpu_count() or 1)
+    else:
+        parts = [ids]
+    if len(parts) < 2:
+        return build_shard(factory, config, order, parts[0], columnar,
+                           options)
+
+    args = (
+        repeat(factory), repeat(config), repeat(order), parts,
+        repeat(columnar), repeat(options)
+    )
+    if executor is not None:
+        results = list(executor.map(build_shard, *args))
+    else:
+        with ProcessPoolExecutor(len(parts)) as pool:
+            results = list(pool.map(build_shard, *args))
+
+    if columnar:
+        return {
+            path: Columns.concat([result[path] for result in results])
+            for path in results[0]
+        }
+    return [model for result in results for model in result]
@@ -0,0 +1,219 @@
+""" Bicycle schema shared by the tests that build models against an
+in-memory SQLite database."""
+
+import sqlite3
+import threading
+import time
+
+from pycyqle.connectors import SQLiteConnector
+from pycyqle.factory import Component, Factory, Inventory, Join
+
+BICYCLES = 20
+WHEELS = 2
+SPOKES = 3
+
+
+class Model:
+    def __init__(self, _id):
+        self.id = _id
+
+    def state(self):
+        """ Returns a comparable snapshot of the model and its inventory."""
+        def _state(value):
+            if isinstance(value, Model):
+                return value.state()
+            if isinstance(value, list):
+                return sorted((_state(v) for v in value), key=repr)
+            return value
+
+        return tuple(sorted(
+            (key, _state(value)) for key, value in vars(self).items()
+        ))
+
+
+class Bicycle(Model):
+    def set_tire(self, tire):
+        self.tire = tire
+
+    def set_seat(self, seat):
+        self.seat = seat
+
+    def set_pedal(self, pedal):
+        self.pedal = pedal
+
+    def set_wheels(self, wheels):
+        self.wheels = wheels
+
+    def set_frame(self, frame):
+        self.frame = frame
+
+
+class Wheel(Model):
+    def set_size(self, size):
+        self.size = size
+
+    def set_spokes(self, spokes):
+        self.spokes = spokes
+
+
+class Spoke(Model):
+    def set_length(self, length):
+        self.length = length
+
+
+class Frame(Model):
+    def set_material(self, material):
+        self.material = material
+
+
+def database(path=':memory:'):
+    """ Returns an SQLite connector to a freshly seeded database."""
+    return SQLiteConnector(seed(path))
+
+
+def seed(path=':memory:'):
+    """ Returns an SQLite connection to a freshly seeded database."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.executescript("""
+        CREATE TABLE bicycle (id INTEGER PRIMARY KEY, tire TEXT,
+                              seat TEXT, pedal TEXT);
+        CREATE TABLE wheel (id INTEGER PRIMARY KEY, bicycle_id INTEGER,
+                            size INTEGER);
+        CREATE TABLE spoke (id INTEGER PRIMARY KEY, wheel_id INTEGER,
+                            length REAL);
+        CREATE TABLE frame (id INTEGER PRIMARY KEY, bicycle_id INTEGER,
+                            material TEXT);
+    """)
+    wheel_id = 0
+    spoke_id = 0
+    for bicycle_id in range(1, BICYCLES + 1):
+        conn.execute(
+            'INSERT INTO bicycle VALUES (?, ?, ?, ?)',
+            (bicycle_id, 'tire-{}'.format(bicycle_id),
+             'seat-{}'.format(bicycle_id), 'pedal-{}'.format(bicycle_id))
+        )
+        conn.execute(
+            'INSERT INTO frame VALUES (?, ?, ?)',
+            (bicycle_id, bicycle_id, 'carbon' if bicycle_id % 2 else 'steel')
+        )
+        for _ in range(WHEELS):
+            wheel_id += 1
+            conn.execute(
+                'INSERT INTO wheel VALUES (?, ?, ?)',
+                (wheel_id, bicycle_id, 26 + wheel_id % 3)
+            )
+            for _ in range(SPOKES):
+                spoke_id += 1
+                conn.execute(
+                    'INSERT INTO spoke VALUES (?, ?, ?)',
+                    (spoke_id, wheel_id, 10.0 + spoke_id / 10)
+                )
+    conn.commit()
+    return conn
+
+
+def _factory(name, table, model, components):
+    return (
+        Factory()
+        .name(name)
+        .table(table)
+        .primary_key('id')
+        .model(model)
+        .components([
+            Component().name(c).column(c).carrier('set_' + c).ctype(ctype)
+            for c, ctype in components.items()
+        ])
+    )
+
+
+def _inventory(name, factory, parent_table, on, single=False):
+    return (
+        Inventory()
+        .name(name)
+        .factory(factory)
+        .join(Join().table(parent_table).on(on))
+        .carrier('set_' + name)
+        .single(single)
+    )
+
+
+def bicycle_factory():
+    """ Returns a bicycle factory with wheels (which carry spokes) and a
+    single frame in its inventory."""
+    spoke = _factory('spoke', 'spoke', Spoke, {'length': 'float'})
+    wheel = _factory('wheel', 'wheel', Wheel, {'size': 'int'})
+    wheel.inventory_items([
+        _inventory('spokes', spoke, 'wheel', 'wheel.id = spoke.wheel_id')
+    ])
+    frame = _factory('frame', 'frame', Frame, {'material': 'string'})
+    bicycle = _factory('bicycle', 'bicycle', Bicycle, {
+        'tire': 'string',
+        'seat': 'string',
+        'pedal': 'string'
+    })
+    return bicycle.inventory_items([
+        _inventory('wheels', wheel, 'bicycle', 'bicycle.id = wheel.bicycle_id'),
+        _inventory(
+            'frame', frame, 'bicycle', 'bicycle.id = frame.bicycle_id', True
+        )
+    ])
+
+
+ORDER = {
+    '__components__': ['tire', 'seat'],
+    'wheels': {
+        '__components__': ['size'],
+        'spokes': ['length']
+    },
+    'frame': ['material']
+}
+
+
+def connect(path):
+    return SQLiteConnector.build({
+        'database': path,
+        'check_same_thread': False
+    })
+
+
+class CountingConnector:
+    """ Connector wrapper that records every query it executes."""
+
+    def __init__(self, mgr):
+        self._mgr = mgr
+        self.queries = []
+
+    def execute(self, query, binds={}):
+        self.queries.append((query, dict(binds)))
+        return self._mgr.execute(query, binds)
+
+    def data(self):
+        return self._mgr.data()
+
+    def close(self):
+        self._mgr.close()
+
+
+class SlowConnector(CountingConnector):
+    """ Connector wrapper that takes delay seconds to run each query and
+    records how many of its instances were running at once."""
+
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self, mgr, delay=0.05):
+        super().__init__(mgr)
+        self._delay = delay
+
+    def execute(self, query, binds={}):
+        cls = SlowConnector
+        with cls.lock:
+            cls.running += 1
+            cls.peak = max(cls.peak, cls.running)
+        try:
+            time.sleep(self._delay)
+            return super().execute(query, binds)
+        finally:
+            with cls.lock:
+                cls.running -= 1
@@ -0,0 +1,63 @@
+import unittest
+
+from pycyqle.assembler import compile_assembler
+from pycyqle.factory import Component
+
+
+class Part:
+    def __init__(self, _id):
+        self.id = _id
+        self.values = {}
+
+    def set_color(self, color):
+        self.values['color'] = color
+
+    def __getattr__(self, name):
+        if not name.startswith('set '):
+            raise AttributeError(name)
+        return lambda value: self.values.__setitem__(name[4:], value)
+
+
+class AssemblerTest(unittest.TestCase):
+
+    COMPONENTS = [
+        Component().name('color').carrier('set_color'),
+        Component().name('size').carrier('set size')
+    ]
+
+    def _assemble(self, data, parent, positional, components=None):
+        assembler = compile_assembler(
+            Part, self.COMPONENTS if components is None else components,
+            parent, positional
+        )
+        _map, ids, payloads = {}, {}, {}
+        assembler(data, _map, ids, payloads)
+        return _map, list(ids), payloads
+
+    def test_positional(self):
+        _map, ids, payloads = self._assemble(
+            [(1, 10, 'red', 'M'), (2, 10, 'blue', 'L'), (1, 11, 'red', 'M')],
+            True, True
+        )
+
+        self.assertEqual(ids, [1, 2])
+        self.assertEqual(_map[2].values, {'color': 'blue', 'size': 'L'})
+        self.assertEqual(payloads, {10: [_map[1], _map[2]], 11: [_map[1]]})
+
+    def test_keyed(self):
+        _map, ids, payloads = self._assemble(
+            [{'__id__': 1, 'color': 'red', 'size': 'S'}], False, False
+        )
+
+        self.assertEqual(ids, [1])
+        self.assertEqual(_map[1].values, {'color': 'red', 'size': 'S'})
+        self.assertEqual(payloads, {})
+
+    def test_id_only(self):
+        _map, ids, _ = self._assemble([(1,), (2,)], False, True, [])
+        self.assertEqual(ids, [1, 2])
+        self.assertEqual(sorted(_map), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,592 @@
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import os
+import tempfile
+import unittest
+
+from pycyqle.cache import ModelCache
+from pycyqle.connectors import (
+    AsyncSQLiteConnector, ConnectionPool, ConnectorConfig, PooledConnector
+)
+from pycyqle.factory import Component, Factory, Inventory, Join
+from pycyqle.test.fixtures import (
+    BICYCLES, ORDER, SPOKES, WHEELS, Bicycle, CountingConnector, Model,
+    SlowConnector, bicycle_factory, connect, database, seed
+)
+from pycyqle.tracing import ProfileAggregator
+
+
+def shout(bicycle):
+    bicycle.tire = bicycle.tire.upper()
+
+
+def run(coroutine):
+    """ Runs coroutine on a new event loop, as asyncio.run does from
+    Python 3.7 on."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class Tag(Model):
+    def set_label(self, label):
+        self.label = label
+
+
+class TaggedBicycle(Bicycle):
+    def set_tags(self, tags):
+        self.tags = tags
+
+
+class AsyncSlowConnector:
+    """ Asynchronous connector wrapper that sleeps before each query and
+    records how many queries were in flight at once."""
+
+    def __init__(self, mgr, delay=0.01):
+        self._mgr = mgr
+        self._delay = delay
+        self.running = 0
+        self.peak = 0
+
+    async def execute(self, query, binds={}):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self._delay)
+            await self._mgr.execute(query, binds)
+        finally:
+            self.running -= 1
+
+    async def data(self):
+        return await self._mgr.data()
+
+
+class BuildTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mgr = database()
+        self.factory = bicycle_factory()
+
+    def tearDown(self):
+        self.mgr.close()
+
+    def _database_file(self):
+        handle, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        database(path).close()
+        self.addCleanup(os.remove, path)
+        return path
+
+    @staticmethod
+    def _states(models):
+        return [model.state() for model in models]
+
+    def test_build(self):
+        bicycles = self.factory.build(self.mgr, ORDER, [3, 1, 2])
+
+        self.assertEqual([b.id for b in bicycles], [3, 1, 2])
+        bicycle = bicycles[1]
+        self.assertEqual(bicycle.tire, 'tire-1')
+        self.assertEqual(bicycle.frame.material, 'carbon')
+        self.assertEqual(len(bicycle.wheels), WHEELS)
+        for wheel in bicycle.wheels:
+            self.assertEqual(len(wheel.spokes), SPOKES)
+
+    def test_single_build(self):
+        [bicycle] = self.factory.build(self.mgr, ['pedal'], 7)
+        self.assertEqual(bicycle.pedal, 'pedal-7')
+
+    def test_full_build(self):
+        bicycles = self.factory.build(self.mgr, ['tire'], None)
+        self.assertEqual(len(bicycles), BICYCLES)
+        bicycles = self.factory.build(self.mgr, ['tire'], [])
+        self.assertEqual(len(bicycles), BICYCLES)
+
+    def test_processors(self):
+        processed = []
+        self.factory.process('wheels', lambda w: processed.append(w.id))
+        self.factory.build(self.mgr, ORDER, [1])
+        self.factory.build(self.mgr, ORDER, [2])
+
+        self.assertEqual(processed, [1, 2, 3, 4])
+        # builds leave the registered factories untouched
+        self.assertIsNone(self.factory.inventory('wheels').factory().parent())
+
+    def test_batch_processors(self):
+        batches = []
+        self.factory.process('wheels', batches.append, batch=True)
+        self.factory.build(self.mgr, ORDER, [1, 2])
+
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(sorted(w.id for w in batches[0]), [1, 2, 3, 4])
+        [stats] = self.factory.processor_stats()[('wheels',)]
+        self.assertEqual(stats['name'], 'append')
+        self.assertEqual(stats['runs'], 1)
+        self.assertEqual(stats['models'], 4)
+
+    def test_process_pool_processors(self):
+        frames = []
+        self.factory.process('frame', frames.extend, batch=True)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.factory.process(shout, executor=executor)
+            bicycles = self.factory.build(self.mgr, ORDER, [1, 2])
+
+        self.assertEqual([b.tire for b in bicycles], ['TIRE-1', 'TIRE-2'])
+        # inventory is not replaced by the copies processed remotely
+        self.assertIn(bicycles[0].frame, frames)
+        self.assertEqual(self.factory.processor_stats()[()][0]['models'], 2)
+
+    def test_sharded_build(self):
+        ids = list(range(BICYCLES, 0, -1))
+        expected = self._states(self.factory.build(self.mgr, ORDER, ids))
+
+        config = ConnectorConfig(
+            'pycyqle.connectors.SQLiteConnector',
+            {'database': self._database_file()}
+        )
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            bicycles = self.factory.build_sharded(
+                config, ORDER, ids, processes=3, executor=executor,
+                strategy='ids'
+            )
+        self.assertEqual([b.id for b in bicycles], ids)
+        self.assertEqual(self._states(bicycles), expected)
+
+        # a single shard is built in this process
+        bicycles = self.factory.build_sharded(config, ORDER, ids[:1])
+        self.assertEqual(self._states(bicycles), expected[:1])
+
+        # so is a scalar ID, like in Factory.build
+        bicycles = self.factory.build_sharded(config, ORDER, ids[0])
+        self.assertEqual(self._states(bicycles), expected[:1])
+
+    def test_chunked_build(self):
+        ids = list(range(1, BICYCLES + 1))
+        expected = self._states(self.factory.build(self.mgr, ORDER, ids))
+
+        mgr = CountingConnector(self.mgr)
+        bicycles = self.factory.build(mgr, ORDER, ids, chunk_size=6)
+
+        self.assertEqual(self._states(bicycles), expected)
+        # four levels per chunk, four chunks
+        self.assertEqual(len(mgr.queries), 16)
+        for _, binds in mgr.queries:
+            self.assertLessEqual(len(binds), 6)
+
+    def test_bucketed_build(self):
+        mgr = CountingConnector(self.mgr)
+        for count in range(5, 9):
+            ids = list(range(1, count + 1))
+            bicycles = self.factory.build(mgr, ORDER, ids, bucket=True)
+            self.assertEqual([b.id for b in bicycles], ids)
+
+        # every level is compiled to the same SQL for 5 to 8 IDs
+        self.assertEqual(len({query for query, _ in mgr.queries}), 4)
+        for _, binds in mgr.queries:
+            self.assertEqual(len(binds), 8)
+
+    def test_iter_build(self):
+        expected = self._states(self.factory.build(self.mgr, ORDER, None))
+
+        batches = list(self.factory.iter_build(
+            self.mgr, ORDER, batch_size=6
+        ))
+
+        self.assertEqual([len(batch) for batch in batches], [6, 6, 6, 2])
+        self.assertEqual(
+            sorted(self._states(sum(batches, [])), key=repr),
+            sorted(expected, key=repr)
+        )
+
+    def test_paginate(self):
+        expected = self._states(self.factory.build(self.mgr, ORDER, None))
+
+        pages = []
+        token = None
+        while True:
+            bicycles, token = self.factory.paginate(
+                self.mgr, ORDER, 6, token
+            )
+            pages.append(bicycles)
+            if token is None:
+                break
+
+        self.assertEqual([len(page) for page in pages], [6, 6, 6, 2])
+        self.assertEqual(self._states(sum(pages, [])), expected)
+
+        # resumes from the token of the first page, in a new build
+        first, token = self.factory.paginate(self.mgr, ['tire'], 6)
+        second, _ = self.factory.paginate(
+            self.mgr, {'__components__': ['tire'], 'wheels': ['size']}, 6,
+            token
+        )
+        self.assertEqual([b.id for b in second], list(range(7, 13)))
+        self.assertEqual(len(second[0].wheels), WHEELS)
+
+        bicycles, token = self.factory.paginate(self.mgr, {
+            '__components__': ['tire'],
+            '__filters__': [['id', '>', 18]]
+        }, 2)
+        self.assertEqual([b.id for b in bicycles], [19, 20])
+        self.assertEqual(self.factory.paginate(self.mgr, ['tire'], 2, token),
+                         ([], None))
+
+        with self.assertRaises(ValueError):
+            self.factory.inventory('wheels').factory().paginate(
+                self.mgr, ['size'], 2, token
+            )
+
+    def test_ids_strategy(self):
+        ids = list(range(1, BICYCLES + 1))
+        expected = self._states(self.factory.build(self.mgr, ORDER, ids))
+
+        mgr = CountingConnector(self.mgr)
+        bicycles = self.factory.build(mgr, ORDER, ids, strategy='ids')
+
+        self.assertEqual(self._states(bicycles), expected)
+        self.assertEqual(len(mgr.queries), 4)
+        for query, _ in mgr.queries:
+            self.assertEqual(query.count('SELECT'), 1)
+
+        # bicycles in chunks of 15 and 5, the first chunk's 30 wheels
+        # have their spokes loaded in two chunks of 15
+        mgr = CountingConnector(self.mgr)
+        bicycles = self.factory.build(
+            mgr, ORDER, ids, chunk_size=15, strategy='ids'
+        )
+        self.assertEqual(self._states(bicycles), expected)
+        self.assertEqual(len(mgr.queries), 2 + (1 + 2 + 1) + (1 + 1 + 1))
+
+    def test_inventory_strategy(self):
+        self.factory.inventory('wheels').strategy('ids')
+        mgr = CountingConnector(self.mgr)
+        self.factory.build(mgr, ORDER, [1, 2])
+
+        nesting = [query.count('SELECT') for query, _ in mgr.queries]
+        # bicycle, wheels, spokes (nested once under wheels), frame
+        self.assertEqual(nesting, [1, 1, 2, 2])
+
+        with self.assertRaises(ValueError):
+            self.factory.inventory('wheels').strategy('join')
+
+    def test_parallel_build(self):
+        ids = list(range(1, BICYCLES + 1))
+        expected = self._states(self.factory.build(self.mgr, ORDER, ids))
+
+        path = self._database_file()
+        pool = ConnectionPool(lambda: SlowConnector(connect(path)), 2)
+        mgr = connect(path)
+        SlowConnector.peak = 0
+        try:
+            bicycles = self.factory.build(mgr, ORDER, ids, pool=pool)
+        finally:
+            mgr.close()
+            pool.close()
+
+        self.assertEqual(self._states(bicycles), expected)
+        # wheels and frame were loaded at the same time
+        self.assertEqual(SlowConnector.peak, 2)
+
+    def test_pooled_build(self):
+        ids = list(range(1, BICYCLES + 1))
+        expected = self._states(self.factory.build(self.mgr, ORDER, ids))
+
+        path = self._database_file()
+        mgr = PooledConnector.build(lambda: connect(path), max_size=2)
+        bicycles = self.factory.build(mgr, ORDER, ids, pool=mgr)
+        stats = mgr.stats()
+        mgr.close()
+
+        self.assertEqual(self._states(bicycles), expected)
+        self.assertEqual(stats['checkouts'], 4)
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_abuild(self):
+        ids = list(range(1, BICYCLES + 1))
+        expected = self._states(self.factory.build(self.mgr, ORDER, ids))
+
+        mgr = AsyncSlowConnector(AsyncSQLiteConnector(seed()))
+        bicycles = run(self.factory.abuild(
+            mgr, ORDER, ids, chunk_size=8, strategy='ids'
+        ))
+
+        self.assertEqual(self._states(bicycles), expected)
+        # wheels and frame were awaited concurrently
+        self.assertEqual(mgr.peak, 2)
+
+    def test_cached_build(self):
+        cache = ModelCache(maxsize=100)
+        mgr = CountingConnector(self.mgr)
+        first = self.factory.build(mgr, ORDER, [1, 2], cache=cache)
+        mgr.queries = []
+        reordered = {
+            'frame': ['material'],
+            'wheels': {'spokes': ['length'], '__components__': ['size']},
+            '__components__': ['seat', 'tire']
+        }
+        second = self.factory.build(mgr, reordered, [2, 3, 1], cache=cache)
+
+        self.assertIs(second[0], first[1])
+        self.assertIs(second[2], first[0])
+        self.assertEqual(second[1].tire, 'tire-3')
+        # only bicycle 3 was queried
+        self.assertEqual(mgr.queries[0][1], {'id0': 3})
+        self.assertEqual(cache.stats()['hits'], 2)
+
+        cache.invalidate(self.factory, [1])
+        mgr.queries = []
+        self.factory.build(mgr, ORDER, [1, 2], cache=cache)
+        self.assertEqual(mgr.queries[0][1], {'id0': 1})
+
+        # a different order does not share the cached models
+        self.factory.build(mgr, ['tire'], [2], cache=cache)
+        self.assertEqual(mgr.queries[-1][1], {'id0': 2})
+
+        # lazy models load on their build's connector and are not cached
+        lazy = self.factory.build(mgr, ORDER, [4], cache=cache, lazy=True)
+        mgr.queries = []
+        eager = self.factory.build(mgr, ORDER, [4], cache=cache)
+        self.assertIsNot(eager[0], lazy[0])
+        self.assertEqual(mgr.queries[0][1], {'id0': 4})
+
+        # factories are told apart even under the same name
+        other = bicycle_factory()
+        mgr.queries = []
+        other.build(mgr, ORDER, [2], cache=cache)
+        self.assertEqual(mgr.queries[0][1], {'id0': 2})
+
+    def test_lazy_build(self):
+        ids = list(range(1, BICYCLES + 1))
+        expected = self._states(self.factory.build(self.mgr, ORDER, ids))
+
+        mgr = CountingConnector(self.mgr)
+        bicycles = self.factory.build(mgr, ORDER, ids, lazy=True)
+        self.assertEqual(len(mgr.queries), 1)
+
+        # the first access loads the wheels of every bicycle at once
+        self.assertEqual(len(bicycles[0].wheels), WHEELS)
+        self.assertEqual(len(bicycles[5].wheels), WHEELS)
+        self.assertEqual(len(mgr.queries), 2)
+
+        self.assertEqual(len(bicycles[3].wheels[1].spokes), SPOKES)
+        self.assertEqual(bicycles[1].frame.material, 'steel')
+        self.assertEqual(len(mgr.queries), 4)
+
+        # loaded inventory replaces the proxies on every model
+        self.assertEqual(self._states(bicycles), expected)
+        self.assertEqual(len(mgr.queries), 4)
+
+    def test_lazy_inventory(self):
+        factory = bicycle_factory()
+        factory.inventory_items()['wheels'].lazy(True)
+        mgr = CountingConnector(self.mgr)
+        bicycles = factory.build(mgr, ORDER, [1, 2], strategy='ids')
+
+        # the frame is built eagerly, the wheels are left for later
+        self.assertEqual(len(mgr.queries), 2)
+        self.assertEqual(bicycles[0].frame.material, 'carbon')
+        self.assertEqual(
+            sorted(w.id for w in bicycles[1].wheels), [3, 4]
+        )
+        self.assertEqual(len(bicycles[1].wheels[0].spokes), SPOKES)
+        self.assertEqual(len(mgr.queries), 4)
+
+    def test_enrich(self):
+        expected = self._states(self.factory.build(self.mgr, ORDER, [1, 2]))
+        bicycles = self.factory.build(self.mgr, ['tire'], [1, 2])
+
+        mgr = CountingConnector(self.mgr)
+        enriched = self.factory.enrich(
+            mgr, bicycles, {
+                '__components__': ['seat'],
+                'wheels': {'__components__': ['size'], 'spokes': ['length']},
+                'frame': ['material']
+            }, key=lambda bicycle: bicycle.id
+        )
+
+        self.assertEqual(enriched, bicycles)
+        self.assertEqual(self._states(bicycles), expected)
+        query, _ = mgr.queries[0]
+        self.assertIn('seat', query)
+        self.assertNotIn('tire', query)
+
+        models = {bicycle.id: bicycle for bicycle in bicycles}
+        self.factory.enrich(self.mgr, models, ['pedal'])
+        self.assertEqual(bicycles[1].pedal, 'pedal-2')
+        self.assertEqual(bicycles[1].seat, 'seat-2')
+
+        with self.assertRaises(ValueError):
+            self.factory.enrich(self.mgr, bicycles, ['pedal'])
+
+    def test_enrich_processors(self):
+        processed = []
+        self.factory.process(lambda b: processed.append(b.id))
+        self.factory.process('frame', lambda f: processed.append(-f.id))
+        bicycles = self.factory.build(self.mgr, ['tire'], [1, 2])
+
+        self.factory.enrich(self.mgr, bicycles, {
+            '__components__': ['seat'], 'frame': ['material']
+        }, key=lambda bicycle: bicycle.id)
+        # root models are not processed twice, new inventory is
+        self.assertEqual(processed, [1, 2, -1, -2])
+
+        self.factory.enrich(self.mgr, bicycles, ['pedal'],
+                            key=lambda bicycle: bicycle.id, process=True)
+        self.assertEqual(processed, [1, 2, -1, -2, 1, 2])
+
+    def test_split_build(self):
+        ids = list(range(1, BICYCLES + 1))
+        expected = self._states(self.factory.build(self.mgr, ORDER, ids))
+
+        mgr = CountingConnector(self.mgr)
+        bicycles = self.factory.build(mgr, ORDER, ids, split=True)
+        self.assertEqual(self._states(bicycles), expected)
+        # one query for the bicycles, two per inventory item
+        self.assertEqual(len(mgr.queries), 1 + 3 * 2)
+
+        bicycles = self.factory.build(
+            mgr, ORDER, ids, split=True, strategy='ids', chunk_size=7
+        )
+        self.assertEqual(self._states(bicycles), expected)
+
+    def _tagged_factory(self):
+        """ Returns the bicycle factory with a 'tags' inventory item, where
+        every bicycle carries all of the 3 tags, along with the item."""
+        self.mgr.execute(
+            'CREATE TABLE tag (id INTEGER PRIMARY KEY, label TEXT)'
+        )
+        self.mgr.execute('CREATE TABLE bicycle_tag (bicycle_id, tag_id)')
+        for tag_id in range(1, 4):
+            self.mgr.execute(
+                'INSERT INTO tag VALUES (%(id)s, %(label)s)',
+                {'id': tag_id, 'label': 'tag-{}'.format(tag_id)}
+            )
+            for bicycle_id in range(1, BICYCLES + 1):
+                self.mgr.execute(
+                    'INSERT INTO bicycle_tag VALUES (%(b)s, %(t)s)',
+                    {'b': bicycle_id, 't': tag_id}
+                )
+
+        tags = Inventory().name('tags').carrier('set_tags').join(
+            Join().shoehorn(
+                'JOIN bicycle_tag ON bicycle_tag.tag_id = tag.id\n'
+                'JOIN bicycle ON bicycle.id = bicycle_tag.bicycle_id'
+            )
+        ).factory(
+            Factory().name('tag').table('tag').primary_key('id').model(Tag)
+            .components([
+                Component().name('label').column('label').carrier('set_label')
+            ])
+        )
+        factory = bicycle_factory().model(TaggedBicycle)
+        factory.inventory_items([tags])
+        return factory, tags
+
+    def test_split_inventory(self):
+        factory, tags = self._tagged_factory()
+        order = {'__components__': ['tire'], 'tags': ['label']}
+        ids = list(range(1, BICYCLES + 1))
+
+        joined = ProfileAggregator()
+        expected = factory.build(self.mgr, order, ids, tracer=joined)
+        tags.split(True)
+        split = ProfileAggregator()
+        bicycles = factory.build(self.mgr, order, ids, tracer=split)
+
+        self.assertEqual(self._states(bicycles), self._states(expected))
+        self.assertIs(bicycles[0].tags[0], bicycles[1].tags[0])
+        joined = joined.profile()[('tag', ('tags',))]
+        split = split.profile()[('tag', ('tags',))]
+        self.assertEqual(joined['rows'], BICYCLES * 3)
+        # the links, then the 3 distinct tags with their labels
+        self.assertEqual(split['queries'], 2)
+        self.assertEqual(split['rows'], BICYCLES * 3 + 3)
+
+    def test_chunked_processors(self):
+        factory, tags = self._tagged_factory()
+        processed = []
+        tags.factory().process(lambda tag: processed.append(tag.id))
+        order = {'__components__': ['tire'], 'tags': ['label']}
+        ids = list(range(1, BICYCLES + 1))
+
+        factory.build(self.mgr, order, ids)
+        self.assertEqual(sorted(processed), [1, 2, 3])
+        # tags reached again by later chunks are processed once
+        del processed[:]
+        factory.build(self.mgr, order, ids, chunk_size=6)
+        self.assertEqual(sorted(processed), [1, 2, 3])
+
+    def test_filtered_build(self):
+        order = {
+            '__components__': ['tire'],
+            '__filters__': [['tire', 'IN', ['tire-2', 'tire-3', 'tire-4']]],
+            'wheels': {
+                '__components__': ['size'],
+                '__filters__': [['size', '>=', 27]],
+                'spokes': {
+                    '__components__': ['length'],
+                    '__limit__': 2,
+                    '__sort__': ['-length']
+                }
+            },
+            'frame': ['material']
+        }
+        self.factory.filter('frame', ['material', '=', 'carbon'])
+        expected = None
+        for options in ({}, {'strategy': 'ids'}, {'split': True}):
+            bicycles = self.factory.build(self.mgr, order, None, **options)
+            self.assertEqual([b.id for b in bicycles], [2, 3, 4], options)
+            for bicycle in bicycles:
+                self.assertEqual(hasattr(bicycle, 'frame'), bicycle.id == 3)
+                for wheel in bicycle.wheels:
+                    self.assertGreaterEqual(wheel.size, 27)
+                    lengths = [spoke.length for spoke in wheel.spokes]
+                    self.assertEqual(len(lengths), 2)
+                    self.assertEqual(lengths, sorted(lengths, reverse=True))
+
+            states = self._states(bicycles)
+            self.assertEqual(states, expected or states)
+            expected = states
+
+        # limited links keep the sort order of their rank, quoting aside
+        mgr = CountingConnector(self.mgr)
+        self.factory.build(mgr, order, None, split=True)
+        ranked = [query for query, _ in mgr.queries if 'ranked' in query]
+        self.assertEqual(len(ranked), 1)
+        self.assertTrue(ranked[0].endswith('ORDER BY ranked.__rank__'))
+        self.assertNotIn('"__rank__"', ranked[0])
+
+    def test_limited_build(self):
+        order = {
+            '__components__': ['tire'],
+            '__limit__': 3,
+            '__sort__': ['-id'],
+            'wheels': ['size']
+        }
+        mgr = CountingConnector(self.mgr)
+        bicycles = self.factory.build(mgr, order, None)
+
+        self.assertEqual([b.id for b in bicycles], [20, 19, 18])
+        self.assertEqual(sum(len(b.wheels) for b in bicycles), 3 * WHEELS)
+        # the limit is bound, the wheels query embeds the bicycles' one
+        self.assertEqual(mgr.queries[1][1], {'n0': 3})
+
+        with self.assertRaises(ValueError):
+            self.factory.build(self.mgr, {'__limit__': -1}, None)
+        with self.assertRaises(ValueError):
+            self.factory.build(
+                self.mgr, {'__filters__': [['tire', 'IS', None]]}, None
+            )
+
+    def test_empty_list_filters(self):
+        for operator, expected in (('IN', 0), ('NOT IN', BICYCLES)):
+            bicycles = self.factory.build(
+                self.mgr, {'__filters__': [['id', operator, []]]}, None
+            )
+            self.assertEqual(len(bicycles), expected, operator)
+
+
+if __name__ == '__main__':
+    unittest.main()
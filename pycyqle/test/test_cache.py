@@ -0,0 +1,122 @@
+import unittest
+from functools import partial
+
+from pycyqle.builder import dict_build
+from pycyqle.cache import LRUCache, ModelCache, PlanCache
+from pycyqle.factory import Component, Factory
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_stats(self):
+        cache = LRUCache()
+        cache.put('a', 1)
+        cache.get('a')
+        cache.get('b')
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=0)
+        cache.put('a', 1)
+        self.assertNotIn('a', cache)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class ModelCacheTest(unittest.TestCase):
+
+    def test_invalidate(self):
+        cache = ModelCache()
+        bicycle, wheel = Factory(), Factory()
+        for _id in range(3):
+            cache.put((bicycle, (), _id), _id)
+        cache.put((wheel, (), 1), 1)
+
+        self.assertEqual(cache.invalidate(bicycle, [1, 2]), 2)
+        self.assertEqual(cache.invalidate(ids=1), 1)
+        self.assertEqual(cache.invalidate(), 1)
+
+
+class PlanCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        Factory.PLANS.invalidate()
+        Factory.PLANS.reset_stats()
+
+    def _factory(self):
+        factory = dict_build(Factory, {
+            'name': 'bicycle-factory',
+            'table': 'bicycle',
+            'primary_key': 'id'
+        })
+        return factory.components(list(map(partial(dict_build, Component), [
+            {'name': 'tire', 'column': 'tire'},
+            {'name': 'seat', 'column': 'seat'}
+        ])))
+
+    def test_invalidate(self):
+        cache = PlanCache()
+        bicycle, wheel, frame = Factory(), Factory(), Factory()
+        root = (bicycle, None, None, None)
+        cache.put(((root,), ('tire',), 1), 'q1')
+        cache.put(((root, (wheel, 'wheels', 'ids', None)), (), 1), 'q2')
+        cache.put((((frame, None, None, None),), (), 1), 'q3')
+
+        self.assertEqual(cache.invalidate(wheel), 1)
+        self.assertEqual(cache.invalidate(), 2)
+
+    def test_factory_plans(self):
+        factory = self._factory()
+        level = factory._level()
+
+        query = factory._plan(level, ['tire'], {'id0': 1, 'id1': 2})
+        self.assertEqual(query, factory.query(['tire'], {'id0': 1, 'id1': 2}))
+        factory._plan(level, ['tire'], {'id0': 3, 'id1': 4})
+        factory._plan(level, ['tire'], {'id0': 3})
+
+        stats = Factory.PLANS.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+
+        factory.components(list(factory.components()))
+        self.assertEqual(len(Factory.PLANS), 0)
+
+    def test_factory_identity(self):
+        factory = self._factory()
+        other = self._factory().table('other')
+        binds = {'id0': 1}
+        self.assertIn('FROM bicycle', factory._plan(
+            factory._level(), ['tire'], binds
+        ))
+        # same name, different table
+        self.assertIn('FROM other', other._plan(
+            other._level(), ['tire'], binds
+        ))
+
+        factory.alias('bk')
+        self.assertIn('bk.tire', factory._plan(
+            factory._level(), ['tire'], binds
+        ))
+        factory.primary_key('code')
+        self.assertIn('bk.code IN', factory._plan(
+            factory._level(), ['tire'], binds
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+import enum
+import unittest
+
+from pycyqle import coercion
+from pycyqle.test.fixtures import ORDER, bicycle_factory, database
+
+
+class Material(enum.Enum):
+    CARBON = 'carbon'
+    STEEL = 'steel'
+
+
+class CoercionTest(unittest.TestCase):
+
+    def _coerce(self, ctype, values):
+        return coercion.coercer(ctype)(values)
+
+    def test_builtin_ctypes(self):
+        self.assertEqual(self._coerce('int', ['1', b'2', None]), [1, 2, None])
+        self.assertEqual(self._coerce('float', [1, '2.5']), [1.0, 2.5])
+        self.assertEqual(
+            self._coerce('decimal', ['1.10', 0.1]),
+            [Decimal('1.10'), Decimal('0.1')]
+        )
+        self.assertEqual(
+            self._coerce('bool', ['true', 'N', 1, b'\x00']),
+            [True, False, True, False]
+        )
+        self.assertEqual(
+            self._coerce('date', ['2020-01-02', datetime(2020, 1, 2, 3)]),
+            [date(2020, 1, 2)] * 2
+        )
+        self.assertEqual(
+            self._coerce('date', ['2020-01-02 03:04:05']), [date(2020, 1, 2)]
+        )
+        self.assertEqual(
+            self._coerce('datetime', ['2020-01-02 03:04:05']),
+            [datetime(2020, 1, 2, 3, 4, 5)]
+        )
+        self.assertEqual(self._coerce('json', ['{"a": [1]}']), [{'a': [1]}])
+        self.assertEqual(self._coerce('json', [b'{"a": [1]}']), [{'a': [1]}])
+        self.assertEqual(
+            self._coerce('enum:{}.Material'.format(__name__), ['steel']),
+            [Material.STEEL]
+        )
+
+    def test_isoformat(self):
+        # used where datetime.fromisoformat is missing (before Python 3.7)
+        self.assertEqual(
+            coercion._isoformat('2020-01-02 03:04:05.5-01:30'),
+            datetime(2020, 1, 2, 3, 4, 5, 500000,
+                     timezone(-timedelta(hours=1, minutes=30)))
+        )
+        self.assertEqual(coercion._isoformat('2020-01-02T03:04'),
+                         datetime(2020, 1, 2, 3, 4))
+        self.assertEqual(coercion._isoformat('2020-01-02').date(),
+                         date(2020, 1, 2))
+        with self.assertRaises(ValueError):
+            coercion._isoformat('02/01/2020')
+
+    def test_untouched_ctypes(self):
+        self.assertIsNone(coercion.coercer('string'))
+        self.assertIsNone(coercion.coercer(None))
+        values = [1, 2]
+        self.assertIs(self._coerce('int', values), values)
+
+    def test_register(self):
+        coercion.register('upper', lambda values: [v.upper() for v in values],
+                          batch=True)
+        self.addCleanup(coercion.COERCERS.pop, 'upper')
+        self.assertEqual(self._coerce('upper', ['a', 'b']), ['A', 'B'])
+
+    def test_coerce_rows(self):
+        convert = coercion.coercer('int')
+        self.assertEqual(
+            coercion.coerce_rows([(1, '2'), (3, '4')], {1: convert}, True),
+            [(1, 2), (3, 4)]
+        )
+        rows = [{'a': '2'}, {'a': None}]
+        coercion.coerce_rows(rows, {'a': convert}, False)
+        self.assertEqual(rows, [{'a': 2}, {'a': None}])
+
+    def test_coerced_build(self):
+        mgr = database()
+        self.addCleanup(mgr.close)
+        factory = bicycle_factory()
+        wheel = factory.inventory('wheels').factory()
+        wheel.component('size').ctype('float')
+        frame = factory.inventory('frame').factory()
+        frame.component('material').ctype(
+            'enum:{}.Material'.format(__name__)
+        )
+
+        [bicycle] = factory.build(mgr, ORDER, 1, coerce=True)
+        self.assertIs(bicycle.frame.material, Material.CARBON)
+        self.assertIsInstance(bicycle.wheels[0].size, float)
+
+        [bicycle] = factory.build(mgr, ORDER, 1)
+        self.assertEqual(bicycle.frame.material, 'carbon')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+
+from pycyqle.columnar import keys
+from pycyqle.connectors import ConnectorConfig, SQLiteConnector
+from pycyqle.test.fixtures import (
+    BICYCLES, ORDER, SPOKES, WHEELS, bicycle_factory, database
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class ColumnarBuildTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mgr = database()
+        self.factory = bicycle_factory()
+
+    def tearDown(self):
+        self.mgr.close()
+
+    def test_build_columnar(self):
+        ids = list(range(1, BICYCLES + 1))
+        bicycles = self.factory.build(self.mgr, ORDER, ids)
+        levels = self.factory.build_columnar(self.mgr, ORDER, ids)
+
+        self.assertEqual(
+            list(levels), [(), ('wheels',), ('wheels', 'spokes'), ('frame',)]
+        )
+        root = levels[()]
+        self.assertEqual(root.ids.tolist(), ids)
+        self.assertEqual(root.ids.dtype, numpy.int64)
+        self.assertEqual(root['tire'][2], 'tire-3')
+        self.assertIsNone(root.offsets)
+
+        wheels = levels[('wheels',)]
+        self.assertEqual(wheels['size'].dtype, numpy.int64)
+        self.assertEqual(wheels.parent_ids.dtype, numpy.int64)
+        self.assertEqual(len(wheels.offsets), BICYCLES + 1)
+        spokes = levels[('wheels', 'spokes')]
+        self.assertEqual(spokes['length'].dtype, numpy.float64)
+        self.assertEqual(len(spokes), BICYCLES * WHEELS * SPOKES)
+
+        for i, bicycle in enumerate(bicycles):
+            rows = wheels.children(i)
+            self.assertEqual(
+                sorted(wheels.ids[rows].tolist()),
+                sorted(w.id for w in bicycle.wheels)
+            )
+            self.assertTrue((wheels.parent_ids[rows] == bicycle.id).all())
+            for j in range(rows.start, rows.stop):
+                lengths = spokes['length'][spokes.children(j)]
+                self.assertEqual(len(lengths), SPOKES)
+
+        frames = levels[('frame',)]
+        self.assertEqual(frames['material'][frames.children(1)], ['steel'])
+
+    def test_chunked_build_columnar(self):
+        ids = list(range(1, BICYCLES + 1))
+        expected = self.factory.build_columnar(self.mgr, ORDER, ids)
+        for strategy in ('subquery', 'ids'):
+            levels = self.factory.build_columnar(
+                self.mgr, ORDER, ids, chunk_size=7, strategy=strategy
+            )
+            for path, columns in expected.items():
+                self.assertEqual(
+                    levels[path].ids.tolist(), columns.ids.tolist()
+                )
+                if columns.offsets is not None:
+                    self.assertEqual(
+                        levels[path].offsets.tolist(),
+                        columns.offsets.tolist()
+                    )
+
+    def test_sharded_build_columnar(self):
+        handle, filename = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        database(filename).close()
+        self.addCleanup(os.remove, filename)
+
+        ids = list(range(1, BICYCLES + 1))
+        expected = self.factory.build_columnar(self.mgr, ORDER, ids)
+        levels = self.factory.build_sharded(
+            ConnectorConfig(SQLiteConnector, {'database': filename}), ORDER,
+            ids, processes=2, columnar=True
+        )
+        self.assertEqual(list(levels), list(expected))
+        for path, columns in expected.items():
+            self.assertEqual(levels[path].ids.tolist(), columns.ids.tolist())
+            if columns.offsets is not None:
+                self.assertEqual(
+                    levels[path].offsets.tolist(), columns.offsets.tolist()
+                )
+
+    def test_empty_levels(self):
+        levels = self.factory.build_columnar(self.mgr, ORDER, [BICYCLES + 1])
+        self.assertEqual(len(levels[()]), 0)
+        self.assertEqual(levels[('wheels', 'spokes')].offsets.tolist(), [0])
+
+    def test_keys(self):
+        self.assertEqual(keys([1, 2]).dtype, numpy.int64)
+        self.assertEqual(keys([]).dtype, numpy.int64)
+        self.assertEqual(keys(['a', 'b']).dtype, object)
+        self.assertEqual(keys([1, 2 ** 64]).dtype, object)
+        self.assertEqual(keys([True, 2]).dtype, object)
+
+
+if __name__ == '__main__':
+    unittest.main()
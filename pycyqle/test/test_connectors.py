@@ -0,0 +1,274 @@
+import threading
+import unittest
+
+from pycyqle.cache import QueryCache
+from pycyqle.connectors import (
+    CachingConnector, ConnectionPool, MySQLConnector, PoolClosed,
+    PooledConnector, PoolTimeout
+)
+from pycyqle.test.fixtures import (
+    BICYCLES, ORDER, CountingConnector, bicycle_factory, database
+)
+
+
+class _Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.column_names = ('__id__', 'tire')
+        self.executed = []
+        self.closed = False
+
+    def execute(self, operation, params=()):
+        self.executed.append((operation, params))
+
+    def fetchall(self):
+        return [(1, 'tire-1')]
+
+    def close(self):
+        self.closed = True
+
+
+class _Connection:
+    def __init__(self):
+        self.cursors = []
+
+    def cursor(self, **kwargs):
+        cursor = _Cursor(self)
+        self.cursors.append((kwargs, cursor))
+        return cursor
+
+    def close(self):
+        pass
+
+
+class MySQLConnectorTest(unittest.TestCase):
+
+    QUERY = 'SELECT * FROM bicycle WHERE id IN (%(id0)s,%(id1)s)'
+
+    def test_prepared(self):
+        conn = _Connection()
+        mgr = MySQLConnector(conn, prepared=True)
+        mgr.execute(self.QUERY, {'id1': 2, 'id0': 1})
+        self.assertEqual(mgr.data(), [{'__id__': 1, 'tire': 'tire-1'}])
+        mgr.execute(self.QUERY, {'id0': 3, 'id1': 4})
+
+        [(kwargs, cursor)] = conn.cursors
+        self.assertEqual(kwargs, {'prepared': True})
+        (first, params), (second, _) = cursor.executed
+        self.assertEqual(first, 'SELECT * FROM bicycle WHERE id IN (%s,%s)')
+        self.assertEqual(params, (1, 2))
+        # the very same statement object is handed back to the cursor
+        self.assertIs(first, second)
+
+    def test_statement_eviction(self):
+        conn = _Connection()
+        mgr = MySQLConnector(conn, prepared=True, max_statements=1)
+        mgr.execute(self.QUERY, {'id0': 1, 'id1': 2})
+        mgr.execute('SELECT 1', {})
+
+        [(_, evicted), (_, current)] = conn.cursors
+        self.assertTrue(evicted.closed)
+        self.assertFalse(current.closed)
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def test_reuse(self):
+        pool = ConnectionPool(_Connection, max_size=2)
+        with pool.connection() as first:
+            with pool.connection() as second:
+                self.assertIsNot(first, second)
+                self.assertEqual(pool.stats()['in_use'], 2)
+        with pool.connection() as third:
+            self.assertIn(third, (first, second))
+
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['checkouts'], 3)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 2)
+
+    def test_min_size(self):
+        pool = ConnectionPool(_Connection, max_size=4, min_size=2)
+        self.assertEqual(pool.stats()['idle'], 2)
+
+    def test_blocking(self):
+        pool = ConnectionPool(_Connection, max_size=1)
+        checked_out = threading.Event()
+        release = threading.Event()
+
+        def _hold():
+            with pool.connection():
+                checked_out.set()
+                release.wait()
+
+        thread = threading.Thread(target=_hold)
+        thread.start()
+        checked_out.wait()
+        threading.Timer(0.05, release.set).start()
+        with pool.connection() as mgr:
+            self.assertIsInstance(mgr, _Connection)
+        thread.join()
+
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_timeout(self):
+        pool = ConnectionPool(_Connection, max_size=1, timeout=0.01)
+        with pool.connection():
+            with self.assertRaises(PoolTimeout):
+                with pool.connection():
+                    pass
+
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_health_check(self):
+        healthy = []
+        pool = ConnectionPool(
+            _Connection, health_check=lambda mgr: mgr in healthy
+        )
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIsNot(first, second)
+            healthy.append(second)
+        with pool.connection() as third:
+            self.assertIs(second, third)
+
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_recycle(self):
+        pool = ConnectionPool(_Connection, recycle=0)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIsNot(first, second)
+
+        self.assertEqual(pool.stats()['created'], 2)
+        self.assertEqual(pool.stats()['idle'], 0)
+
+    def test_refill(self):
+        healthy = []
+        pool = ConnectionPool(
+            _Connection, max_size=4, min_size=2,
+            health_check=lambda mgr: mgr in healthy
+        )
+        with pool.connection() as mgr:
+            healthy.append(mgr)
+        # both idle connectors failed their health check
+        self.assertEqual(pool.stats()['discarded'], 2)
+        self.assertEqual(pool.stats()['idle'], 2)
+        self.assertEqual(pool.stats()['created'], 4)
+
+    def test_pooled_connector(self):
+        mgr = PooledConnector.build(database, max_size=1)
+        mgr.execute('SELECT tire FROM bicycle WHERE id = %(id0)s', {'id0': 3})
+        self.assertEqual(mgr.data(), [{'tire': 'tire-3'}])
+        self.assertEqual(mgr.stats()['in_use'], 0)
+
+        mgr.execute("UPDATE bicycle SET tire = 'slick' WHERE id = 3")
+        self.assertEqual(mgr.data(), [])
+        mgr.execute('SELECT tire FROM bicycle WHERE id = 3')
+        self.assertEqual(mgr.rows(), [('slick',)])
+        self.assertEqual(mgr.data(), [{'tire': 'slick'}])
+        self.assertEqual(mgr.data(), [{'tire': 'slick'}])
+        mgr.close()
+
+        # connectors without rows() can be pooled too
+        mgr = PooledConnector.build(
+            lambda: CountingConnector(database()), max_size=1
+        )
+        mgr.execute('SELECT tire FROM bicycle WHERE id = 3')
+        self.assertEqual(mgr.rows(), [('tire-3',)])
+        self.assertEqual(mgr.data(), [{'tire': 'tire-3'}])
+        mgr.close()
+
+    def test_closed(self):
+        pool = ConnectionPool(_Connection, max_size=2)
+        pool.close()
+        with self.assertRaises(PoolClosed):
+            with pool.connection():
+                pass
+        self.assertEqual(pool.stats()['created'], 0)
+
+
+class CachingConnectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.counting = CountingConnector(database())
+        self.mgr = CachingConnector(self.counting)
+
+    def tearDown(self):
+        self.mgr.close()
+
+    def test_build(self):
+        factory = bicycle_factory()
+        ids = list(range(1, BICYCLES + 1))
+        first = factory.build(self.mgr, ORDER, ids)
+        second = factory.build(self.mgr, ORDER, ids)
+        # the frames query is shared with the first builds
+        factory.build(self.mgr, {'__components__': ['tire'], 'frame': [
+            'material'
+        ]}, ids)
+
+        self.assertEqual(
+            [b.state() for b in first], [b.state() for b in second]
+        )
+        self.assertEqual(len(self.counting.queries), 5)
+        stats = self.mgr.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (5, 5))
+        self.assertGreater(stats['bytes_saved'], 0)
+
+        self.assertEqual(self.mgr.invalidate(*factory.tables()), 5)
+        self.assertEqual(self.mgr.stats()['bytes'], 0)
+
+    def test_invalidation(self):
+        query = 'SELECT tire FROM bicycle WHERE id = %(id0)s'
+        self.mgr.execute(query, {'id0': 3})
+        self.mgr.execute('SELECT size FROM wheel WHERE id = 1')
+        self.mgr.execute(
+            "UPDATE bicycle SET tire = 'slick' WHERE id = %(id0)s", {'id0': 3}
+        )
+        self.assertEqual(len(self.mgr.cache), 1)
+
+        self.mgr.execute('  SELECT tire\n  FROM bicycle\n  WHERE id = '
+                         '%(id0)s', {'id0': 3})
+        self.assertEqual(self.mgr.data(), [{'tire': 'slick'}])
+        self.mgr.execute(query, {'id0': 3})
+        self.assertEqual(self.mgr.rows(), [('slick',)])
+        self.assertEqual(len(self.counting.queries), 4)
+
+    def test_stream(self):
+        query = 'SELECT id FROM bicycle ORDER BY id'
+        ids = list(range(1, BICYCLES + 1))
+        self.mgr.execute(query)
+        batches = list(self.mgr.stream(query, {}, 7))
+        self.assertEqual([row['id'] for rows in batches for row in rows], ids)
+        self.assertEqual(max(len(rows) for rows in batches), 7)
+        self.assertEqual(len(self.counting.queries), 1)
+
+        # uncached results are streamed from the wrapped connector
+        mgr = CachingConnector(database())
+        batches = list(mgr.stream(query, {}, 7))
+        self.assertEqual([row['id'] for rows in batches for row in rows], ids)
+        self.assertEqual(len(mgr.cache), 0)
+        mgr.close()
+
+    def test_memory_bound(self):
+        cache = QueryCache(maxbytes=1000)
+        cache.put('a', 1, 600, ['bicycle'])
+        cache.put('b', 2, 300, ['wheel'])
+        cache.put('c', 3, 300, ['wheel'])
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.stats()['bytes'], 600)
+
+        cache.put('d', 4, 2000)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['bytes'], 0)
+        self.assertEqual(
+            QueryCache.key("SELECT  'a  b'\n FROM t", {}),
+            ("SELECT 'a  b' FROM t", ())
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
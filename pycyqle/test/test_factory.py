@@ -77,6 +77,62 @@ class FactoryTest(unittest.TestCase):
             """)
         )
 
+    def test_bucket_size(self):
+        self.assertEqual(Factory.bucket_size(1, True), 1)
+        self.assertEqual(Factory.bucket_size(5, True), 8)
+        self.assertEqual(Factory.bucket_size(8, True), 8)
+        self.assertEqual(Factory.bucket_size(5, 10), 10)
+        self.assertEqual(Factory.bucket_size(11, 10), 20)
+        self.assertEqual(Factory.bucket_size(3, lambda n: n * 2), 6)
+        with self.assertRaises(ValueError):
+            Factory.bucket_size(3, lambda n: 1)
+
+    def test_bucket_binds(self):
+        self.assertEqual(
+            Factory.binds([4, 5, 6], True),
+            {'id0': 4, 'id1': 5, 'id2': 6, 'id3': 6}
+        )
+        self.assertEqual(Factory.binds([], True), {})
+
+    def test_filtered_query(self):
+        factory = self.test_dict_build()
+        factory.components([
+            dict_build(Component, {'name': 'tire', 'column': 'tire_code'})
+        ])
+        factory.filter(['seat', 'IS NOT NULL'])
+        level = factory._level({
+            '__filters__': [['tire', 'in', ['a', 'b']]],
+            '__limit__': 5,
+            '__sort__': ['-tire']
+        })
+
+        self.assertEqual(
+            FactoryTest._format_query(
+                factory.query(['tire'], {'id0': 42}, level=level)
+            ),
+            FactoryTest._format_query("""
+            SELECT ranked.__id__, ranked.tire FROM (
+                SELECT bicycle.id AS "__id__"
+                ,   bicycle.tire_code AS tire
+                ,   ROW_NUMBER() OVER (ORDER BY bicycle.tire_code DESC)
+                    AS __rank__
+                FROM bicycle
+                WHERE bicycle.id IN (%(id0)s)
+                AND bicycle.seat IS NOT NULL
+                AND bicycle.tire_code IN (%(w0_1_0)s,%(w0_1_1)s)
+            ) ranked
+            WHERE ranked.__rank__ <= %(n0)s
+            ORDER BY ranked.__rank__
+            """)
+        )
+        self.assertEqual(
+            level.params({'id0': 42}),
+            {'id0': 42, 'w0_1_0': 'a', 'w0_1_1': 'b', 'n0': 5}
+        )
+
+        with self.assertRaises(ValueError):
+            factory.filter(['tire; DROP TABLE bicycle', '=', 1])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import time
+import unittest
+
+from pycyqle.recording import (
+    Recording, RecordingConnector, ReplayConnector, ReplayMiss
+)
+from pycyqle.test.fixtures import (
+    BICYCLES, ORDER, CountingConnector, bicycle_factory, database
+)
+
+
+class RecordingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mgr = database()
+        self.factory = bicycle_factory()
+
+    def tearDown(self):
+        self.mgr.close()
+
+    def _path(self):
+        handle, path = tempfile.mkstemp(suffix='.rec')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        return path
+
+    @staticmethod
+    def _states(models):
+        return [model.state() for model in models]
+
+    def test_replay(self):
+        ids = list(range(1, BICYCLES + 1))
+        mgr = RecordingConnector(self.mgr)
+        expected = self._states(self.factory.build(mgr, ORDER, ids))
+        self.assertEqual(len(mgr.recording), 4)
+
+        path = self._path()
+        mgr.recording.save(path)
+        replay = ReplayConnector.build(path)
+        bicycles = self.factory.build(replay, ORDER, ids)
+        self.assertEqual(self._states(bicycles), expected)
+        self.assertEqual(replay.queries, 4)
+
+        # connectors without rows() are recorded too
+        mgr = RecordingConnector(CountingConnector(self.mgr))
+        self.factory.build(mgr, ORDER, ids, strategy='ids')
+        bicycles = self.factory.build(
+            ReplayConnector(mgr.recording), ORDER, ids, strategy='ids'
+        )
+        self.assertEqual(self._states(bicycles), expected)
+
+        with self.assertRaises(ReplayMiss):
+            self.factory.build(replay, ORDER, [1])
+
+    def test_repeated_queries(self):
+        mgr = RecordingConnector(self.mgr)
+        mgr.execute('SELECT COUNT(*) AS n FROM bicycle')
+        self.mgr.execute('DELETE FROM bicycle WHERE id > 10')
+        mgr.execute('SELECT COUNT(*) AS n FROM bicycle')
+
+        replay = ReplayConnector(mgr.recording)
+        counts = []
+        for _ in range(3):
+            replay.execute('SELECT COUNT(*) AS n FROM bicycle')
+            counts.append(replay.data()[0]['n'])
+        self.assertEqual(counts, [BICYCLES, 10, 10])
+
+        replay.rewind()
+        replay.execute('SELECT COUNT(*) AS n FROM bicycle')
+        self.assertEqual(replay.rows(), [(BICYCLES,)])
+
+    def test_latency(self):
+        recording = Recording()
+        mgr = RecordingConnector(self.mgr, recording)
+        self.factory.build(mgr, ['tire'], [1])
+
+        replay = ReplayConnector(recording, latency=0.05)
+        start = time.perf_counter()
+        self.factory.build(replay, ['tire'], [1])
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+        with self.assertRaises(ValueError):
+            ReplayConnector(recording, latency='slow')
+
+
+if __name__ == '__main__':
+    unittest.main()
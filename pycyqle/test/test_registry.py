@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pycyqle.registry import compile_registry, load_registry
+from pycyqle.test.fixtures import Bicycle, Wheel, database
+
+BICYCLE = {
+    'name': 'bicycle',
+    'table': 'bicycle',
+    'primary_key': 'id',
+    'model': 'pycyqle.test.fixtures.Bicycle',
+    'components': {
+        'tire': {'column': 'tire', 'carrier': 'set_tire'}
+    },
+    'inventory': {
+        'wheels': {
+            'factory': 'wheel.json',
+            'join': {'table': 'bicycle', 'on': 'bicycle.id = wheel.bicycle_id'},
+            'carrier': 'set_wheels'
+        }
+    }
+}
+
+WHEEL = {
+    'name': 'wheel',
+    'table': 'wheel',
+    'primary_key': 'id',
+    'model': 'pycyqle.test.fixtures.Wheel',
+    'components': {
+        'size': {'column': 'size', 'carrier': 'set_size', 'type': 'int'}
+    }
+}
+
+
+class RegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        for dic in (BICYCLE, WHEEL):
+            path = os.path.join(self.directory, dic['name'] + '.json')
+            with open(path, 'w') as handle:
+                json.dump(dic, handle)
+        self.snapshot = os.path.join(self.directory, 'registry.snapshot')
+
+    def test_snapshot(self):
+        names = compile_registry(self.directory, self.snapshot)
+        self.assertEqual(names, ['bicycle', 'wheel'])
+
+        registry = {}
+        factories = load_registry(self.snapshot, registry)
+        self.assertEqual(registry, factories)
+        bicycle = factories['bicycle']
+        self.assertIs(bicycle.inventory('wheels').factory(), registry['wheel'])
+        # model classes are resolved when the snapshot is loaded
+        self.assertIs(bicycle._constructor, Bicycle)
+        self.assertIs(registry['wheel']._constructor, Wheel)
+
+        mgr = database()
+        self.addCleanup(mgr.close)
+        [model] = bicycle.build(
+            mgr, {'__components__': ['tire'], 'wheels': ['size']}, 2
+        )
+        self.assertEqual(model.tire, 'tire-2')
+        self.assertEqual(len(model.wheels), 2)
+
+    def test_invalid_factory(self):
+        path = os.path.join(self.directory, 'broken.json')
+        with open(path, 'w') as handle:
+            json.dump(dict(WHEEL, name='broken', model=''), handle)
+
+        with self.assertRaises(Exception):
+            compile_registry(self.directory, self.snapshot)
+        self.assertFalse(os.path.exists(self.snapshot))
+
+    def test_version(self):
+        with open(self.snapshot, 'w') as handle:
+            json.dump({'version': 0, 'factories': {}}, handle)
+
+        with self.assertRaises(ValueError):
+            load_registry(self.snapshot, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
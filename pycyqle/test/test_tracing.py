@@ -0,0 +1,91 @@
+import unittest
+
+from pycyqle.test.fixtures import (
+    BICYCLES, ORDER, SPOKES, WHEELS, bicycle_factory, database
+)
+from pycyqle.tracing import ProfileAggregator, Span, Tracer
+
+
+class ListTracer(Tracer):
+
+    def __init__(self):
+        self.spans = []
+
+    def record(self, span):
+        self.spans.append(span)
+
+
+class TracingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mgr = database()
+        self.factory = bicycle_factory()
+
+    def tearDown(self):
+        self.mgr.close()
+
+    def test_spans(self):
+        tracer = ListTracer()
+        self.factory.build(self.mgr, ORDER, [1, 2], tracer=tracer)
+
+        spans = {span.path: span for span in tracer.spans}
+        self.assertEqual(
+            sorted(spans), [(), ('frame',), ('wheels',), ('wheels', 'spokes')]
+        )
+        root = spans[()]
+        self.assertEqual(root.factory, 'bicycle')
+        self.assertEqual(root.binds, 2)
+        self.assertEqual(root.rows, 2)
+        self.assertEqual(root.created, 2)
+        self.assertIn('FROM bicycle', root.query)
+        spokes = spans[('wheels', 'spokes')]
+        self.assertEqual(spokes.factory, 'spoke')
+        self.assertEqual(spokes.rows, 2 * WHEELS * SPOKES)
+        for span in tracer.spans:
+            self.assertGreater(span.execute_time, 0)
+            self.assertGreaterEqual(span.assembly_time, 0)
+
+    def test_reused_models(self):
+        tracer = ListTracer()
+        models = {
+            bicycle.id: bicycle
+            for bicycle in self.factory.build(self.mgr, ['tire'], [1, 2])
+        }
+        self.factory.enrich(self.mgr, models, ['seat'], tracer=tracer)
+
+        [span] = tracer.spans
+        self.assertEqual((span.created, span.reused), (0, 2))
+
+    def test_profile(self):
+        profiler = ProfileAggregator(keep_spans=True)
+        ids = list(range(1, BICYCLES + 1))
+        self.factory.process('wheels', lambda wheel: None)
+        self.factory.build(
+            self.mgr, ORDER, ids, chunk_size=5, strategy='ids', tracer=profiler
+        )
+
+        profile = profiler.profile()
+        root = profile[('bicycle', ())]
+        self.assertEqual(root['queries'], 4)
+        self.assertEqual(root['rows'], BICYCLES)
+        wheels = profile[('wheel', ('wheels',))]
+        self.assertEqual(wheels['created'], BICYCLES * WHEELS)
+        self.assertGreater(wheels['processor_time'], 0)
+        # the 10 wheels of each chunk have their spokes loaded in two chunks
+        self.assertEqual(len(profiler.spans), 4 * (1 + 1 + 2 + 1))
+
+        table = profiler.table().splitlines()
+        self.assertEqual(len(table), 5)
+        self.assertTrue(table[0].startswith('level'))
+        self.assertIn('wheels.spokes (spoke)', profiler.table())
+
+        profiler.reset()
+        self.assertEqual(profiler.profile(), {})
+
+    def test_span_dict(self):
+        span = Span('bicycle', (), 'SELECT 1', 0)
+        self.assertEqual(span.as_dict()['query'], 'SELECT 1')
+
+
+if __name__ == '__main__':
+    unittest.main()
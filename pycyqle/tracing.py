@@ -0,0 +1,129 @@
+""" Build instrumentation.
+
+Builds given a tracer hand it one Span per query they run, that is, one
+per level of the order tree and chunk of binds, once the models of that
+level are assembled, processed and delivered to their parents.
+ProfileAggregator keeps them in memory and sums them up per factory.
+"""
+
+import threading
+
+
+class Span:
+    """ What one query of a build cost.
+    path holds the inventory names leading from the root factory to the
+    level. Times are in seconds: execute_time is spent running the query
+    and fetch_time reading its rows; coercion_time converting values (see
+    BuildContext); assembly_time creating models and calling their
+    carriers; and processor_time running processors. created counts the
+    models the rows added to the model map and reused those already in
+    it."""
+
+    __slots__ = (
+        'factory', 'path', 'query', 'binds', 'rows', 'created', 'reused',
+        'execute_time', 'fetch_time', 'coercion_time', 'assembly_time',
+        'processor_time'
+    )
+
+    def __init__(self, factory, path, query, binds):
+        self.factory = factory
+        self.path = path
+        self.query = query
+        self.binds = binds
+        self.rows = 0
+        self.created = 0
+        self.reused = 0
+        self.execute_time = 0.0
+        self.fetch_time = 0.0
+        self.coercion_time = 0.0
+        self.assembly_time = 0.0
+        self.processor_time = 0.0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in Span.__slots__}
+
+    @staticmethod
+    def merge(span, other):
+        """ Adds the binds, rows and times of other to span, for levels
+        loaded with several queries reported as one, and returns it. Either
+        may be None."""
+        if span is None or other is None:
+            return span or other
+
+        for name in ('binds', 'rows', 'execute_time', 'fetch_time'):
+            setattr(span, name, getattr(span, name) + getattr(other, name))
+        return span
+
+
+class Tracer:
+    """ Base class for build tracers: record is called with the Span of
+    every query, possibly from several threads in parallel builds."""
+
+    def record(self, span):
+        pass
+
+
+class ProfileAggregator(Tracer):
+    """ Tracer summing spans up per factory and path. Spans themselves are
+    kept too if keep_spans is True."""
+
+    COUNTERS = ('rows', 'created', 'reused')
+    TIMERS = (
+        'execute_time', 'fetch_time', 'coercion_time', 'assembly_time',
+        'processor_time'
+    )
+
+    def __init__(self, keep_spans=False):
+        self._keep_spans = keep_spans
+        self._lock = threading.Lock()
+        self._profile = {}
+        self.spans = []
+
+    def record(self, span):
+        key = (span.factory, span.path)
+        with self._lock:
+            if self._keep_spans:
+                self.spans.append(span)
+
+            entry = self._profile.get(key)
+            if entry is None:
+                entry = self._profile[key] = dict.fromkeys(
+                    ('queries', 'binds') + self.COUNTERS + self.TIMERS, 0
+                )
+            entry['queries'] += 1
+            entry['binds'] += span.binds
+            for name in self.COUNTERS + self.TIMERS:
+                entry[name] += getattr(span, name)
+
+    def profile(self):
+        """ Returns the totals recorded for every (factory, path) pair."""
+        with self._lock:
+            return {key: dict(entry) for key, entry in self._profile.items()}
+
+    def reset(self):
+        with self._lock:
+            self._profile = {}
+            self.spans = []
+
+    def table(self):
+        """ Returns the profile as a text table, one line per level in
+        order tree order, with times in milliseconds."""
+        columns = ('queries', 'rows', 'created', 'reused') + tuple(
+            name[:-len('_time')] for name in self.TIMERS
+        )
+        lines = ['{:<30}'.format('level') + ''.join(
+            '{:>11}'.format(column) for column in columns
+        )]
+        rows = sorted(self.profile().items(), key=lambda i: i[0][::-1])
+        for (factory, path), entry in rows:
+            label = '{} ({})'.format('.'.join(path), factory) \
+                if path else factory
+            values = [entry[name] for name in columns[:4]] + [
+                entry[name] * 1000 for name in self.TIMERS
+            ]
+            lines.append('{:<30}'.format(label[:30]) + ''.join(
+                '{:>11}'.format(v) if isinstance(v, int)
+                else '{:>11.2f}'.format(v)
+                for v in values
+            ))
+        return '\n'.join(lines)
@@ -1,15 +1,92 @@
+import time
+
+
+def _apply(closure, batch, models):
+    if batch:
+        closure(models)
+        return models
+
+    for model in models:
+        if isinstance(closure, str):
+            method = getattr(model, closure)
+            method()
+        elif callable(closure):
+            closure(model)
+    return models
+
+
+def _remote(closure, batch, models):
+    """ Runs a processor in a worker process and sends back the attributes
+    it set on each model. Attributes left alone, such as inventory, are
+    not copied back over the originals."""
+    before = [dict(vars(model)) for model in models]
+    _apply(closure, batch, models)
+    return [
+        {
+            key: value for key, value in vars(model).items()
+            if key not in state or state[key] is not value
+        }
+        for model, state in zip(models, before)
+    ]
+
+
 class Processor:
-    def __init__(self, closure):
+    """ Post-processes the models assembled for one level of a build.
+    The closure is called with each model, or with the whole list of
+    models when batch is True.
+    With an executor (typically a ProcessPoolExecutor), the closure runs
+    there on pickled copies of the models, in chunks of chunk_size models
+    unless it is a batch processor, and the attributes it sets are copied
+    back. The closure and the models must be picklable and models
+    must keep their state in their __dict__.
+    Calls, processed models and elapsed time are reported by stats()."""
+
+    def __init__(self, closure, batch=False, executor=None, chunk_size=256):
         self._closure = closure
-        self._models = []
-
-    def attach(self, model):
-        self._models.append(model)
-
-    def run(self):
-        for model in self._models:
-            if isinstance(self._closure, str):
-                method = getattr(model, self._closure)
-                method()
-            elif callable(self._closure):
-                self._closure(model)
+        self._batch = batch
+        self._executor = executor
+        self._chunk_size = chunk_size
+        self._stats = {'runs': 0, 'models': 0, 'time': 0.0}
+
+    def name(self):
+        if isinstance(self._closure, str):
+            return self._closure
+        return getattr(self._closure, '__name__', repr(self._closure))
+
+    def run(self, models):
+        start = time.perf_counter()
+        if self._executor is None:
+            _apply(self._closure, self._batch, models)
+        else:
+            self._run_remote(models)
+
+        self._stats['runs'] += 1
+        self._stats['models'] += len(models)
+        self._stats['time'] += time.perf_counter() - start
+
+    def _run_remote(self, models):
+        size = len(models) if self._batch else self._chunk_size
+        chunks = [
+            models[i:i + size] for i in range(0, len(models), size or 1)
+        ]
+        states = self._executor.map(
+            _remote,
+            [self._closure] * len(chunks),
+            [self._batch] * len(chunks),
+            chunks
+        )
+        for chunk, chunk_states in zip(chunks, states):
+            for model, state in zip(chunk, chunk_states):
+                vars(model).update(state)
+
+    def stats(self):
+        """ Returns the number of runs, the number of models processed and
+        the time spent processing them, in seconds."""
+        stats = dict(self._stats, name=self.name())
+        stats['avg_time'] = (
+            stats['time'] / stats['runs'] if stats['runs'] else 0.0
+        )
+        return stats
+
+    def reset_stats(self):
+        self._stats = {'runs': 0, 'models': 0, 'time': 0.0}
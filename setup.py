@@ -15,6 +15,9 @@ setup(
     extras_require={
         'dev': [
             'pylint'
+        ],
+        'numpy': [
+            'numpy'
         ]
     }
 )